@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from var_engine.model import Graph, Node, RiskFactor, Sensitivity
+
+DATES = pd.date_range("2023-01-02", periods=300, freq="D", name="Date")
+
+
+def create_risk_factor(name: str, seed: int) -> RiskFactor:
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame(
+        {
+            "returns": rng.normal(scale=0.01, size=len(DATES)),
+            "quality": rng.integers(0, 2, size=len(DATES)),
+        },
+        index=DATES,
+    )
+    return RiskFactor(name, data, "EQ", "REL")
+
+
+def create_node(name: str, children: list, rf: RiskFactor = None) -> Node:
+    sensitivity = None
+    if rf is not None:
+        sensitivity = Sensitivity(name)
+        sensitivity.add_risk_factor(rf, {"Type": "Delta"}, 1000.0)
+    return Node(name, children, sensitivity)
+
+
+@pytest.fixture
+def make_risk_factor():
+    # Risk factor with random returns and quality on DATES
+    return create_risk_factor
+
+
+@pytest.fixture
+def make_node():
+    # Node with an optional delta of 1000 on one risk factor
+    return create_node
+
+
+@pytest.fixture
+def tree() -> Graph:
+    # root -> (A -> (A1, A2), B)
+    a1 = create_node("A1", [], create_risk_factor("RF1", 1))
+    a2 = create_node("A2", [], create_risk_factor("RF2", 2))
+    a = create_node("A", [a1, a2])
+    b = create_node("B", [], create_risk_factor("RF3", 3))
+    root = create_node("root", [a, b])
+    nodes = {node.name: node for node in (root, a, a1, a2, b)}
+    return Graph("test", root, nodes)
+
+
+@pytest.fixture
+def tree_market_data(tree) -> dict:
+    # Risk factors of the tree, by name
+    return {
+        rf.name: rf
+        for node in tree.nodes.values()
+        if node.get_sensitivity()
+        for rf in node.get_sensitivity().get_risk_factors()
+    }
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from var_engine import bootstrap
+from var_engine.bootstrap import block_bootstrap_VaR, bootstrap_VaR_between
+from var_engine.model import Graph, Node
+
+
+def test_bootstrap_interval_with_brw_weights():
+    root = Node("root", [], None)
+    graph = Graph("test", root, {"root": root})
+    graph.set_scenario_weights(0.97)
+    PnL = np.random.default_rng(0).normal(size=250)
+    PnL[-5:] -= 5  # Recent losses, heavy with the BRW weights
+    VaR = graph.compute_VaR_from_PnL(PnL)
+
+    lower, upper = block_bootstrap_VaR(
+        PnL, graph.percentile, 500, 5, 0.9, np.random.default_rng(1), 0.97
+    )
+    assert lower <= VaR <= upper
+
+
+def test_bootstrap_independent_of_workers(tree, monkeypatch):
+    tree.compute_PnL()
+    tree.set_scenario_weights(0.97)
+    args = (tree, "01/03/2023", "2023-10-01", 50)
+    reference = bootstrap_VaR_between(*args, nb_workers=1)
+    assert len(reference) == 215 and (reference["VaR_lower"] > 0).all()
+
+    pd.testing.assert_frame_equal(bootstrap_VaR_between(*args, nb_workers=2), reference)
+    monkeypatch.setattr(bootstrap, "BOOTSTRAP_CHUNK", 7)
+    pd.testing.assert_frame_equal(bootstrap_VaR_between(*args, nb_workers=3), reference)
@@ -0,0 +1,117 @@
+import asyncio
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from var_engine import ingestion
+from var_engine.default_config import PRICE_TABLE
+from var_engine.ingestion import PnLScheduler, find_feeds, read_feed
+from var_engine.read import read_input_file
+from var_engine.var_study import VaRStudy
+
+EXAMPLE = Path(__file__).parents[1] / "var_engine/data/template/example.xlsx"
+
+
+def write_database(path: Path, prices: pd.DataFrame):
+    # One row per (Date, RF) in the price table
+    rows = prices.rename_axis("Date").reset_index().melt("Date", var_name="RF")
+    rows = rows.dropna().rename(columns={"value": "Value"})
+    rows["Date"] = rows["Date"].dt.strftime("%Y-%m-%d")
+    with closing(sqlite3.connect(path)) as con:
+        rows.to_sql(PRICE_TABLE, con, index=False)
+
+
+def test_find_feeds(tmp_path):
+    (tmp_path / "RF1.csv").write_text("Date,RF1\n2024-01-02,1\n")
+    (tmp_path / "other.csv").write_text("Date,other\n2024-01-02,1\n")
+    db_path = tmp_path / "prices.db"
+
+    # Landing directory first, database for the others
+    feeds = find_feeds(["RF1", "RF2"], tmp_path, db_path)
+    assert feeds == {"RF1": tmp_path / "RF1.csv", "RF2": db_path}
+
+    with pytest.raises(AssertionError, match="Missing market data: RF2"):
+        find_feeds(["RF1", "RF2"], tmp_path)
+
+
+def test_find_feeds_parquet_engine(tmp_path, monkeypatch):
+    (tmp_path / "RF1.parquet").write_bytes(b"")
+    monkeypatch.setattr(ingestion, "find_spec", lambda name: None)
+    with pytest.raises(AssertionError, match="RF1.parquet needs pyarrow"):
+        find_feeds(["RF1"], tmp_path)
+
+
+def test_read_feed(tmp_path):
+    expected = pd.Series(
+        [1.5, 2.5],
+        index=pd.DatetimeIndex(["2024-01-02", "2024-01-03"], name="Date"),
+        name="RF1",
+    )
+
+    # CSV: column named after the risk factor, or a single value column
+    (tmp_path / "RF1.csv").write_text(
+        "Date,RF1,RF2\n2024-01-02,1.5,0\n2024-01-03,2.5,0\n"
+    )
+    pd.testing.assert_series_equal(read_feed("RF1", tmp_path / "RF1.csv"), expected)
+    (tmp_path / "RF3.csv").write_text("Date,Value\n2024-01-02,1.5\n2024-01-03,2.5\n")
+    pd.testing.assert_series_equal(read_feed("RF1", tmp_path / "RF3.csv"), expected)
+
+    # SQLite price table
+    write_database(
+        tmp_path / "prices.db",
+        pd.DataFrame({"RF1": [1.5, 2.5], "RF2": [3.0, np.nan]}, index=expected.index),
+    )
+    pd.testing.assert_series_equal(read_feed("RF1", tmp_path / "prices.db"), expected)
+    with pytest.raises(AssertionError, match="No market data for RF9"):
+        read_feed("RF9", tmp_path / "prices.db")
+
+
+def test_scheduler_order(tree):
+    scheduler = PnLScheduler(tree)
+
+    # A node is queued once all its risk factors are loaded
+    scheduler.risk_factor_loaded("RF1")
+    assert list(scheduler.queue._queue) == ["A1"]
+    scheduler.risk_factor_loaded("RF3")
+    assert list(scheduler.queue._queue) == ["A1", "B"]
+    scheduler.risk_factor_loaded("RF2")
+    assert list(scheduler.queue._queue) == ["A1", "B", "A2", "A", "root"]
+
+    # Children are computed before their parent
+    computed = []
+    compute_PnL = tree.compute_PnL
+
+    def record(re_compute, node_name):
+        for child in tree.get_node(node_name).get_children():
+            assert child.name in computed
+        computed.append(node_name)
+        return compute_PnL(re_compute, node_name)
+
+    tree.compute_PnL = record
+    scheduler.close()
+    asyncio.run(scheduler.run())
+    assert computed == ["A1", "B", "A2", "A", "root"]
+
+
+def test_compute_from_feeds(tmp_path):
+    market_data_df = read_input_file(EXAMPLE)[0]
+    landing_dir = tmp_path / "landing"
+    landing_dir.mkdir()
+    for rf_name in market_data_df.columns[:2]:  # Others in the database
+        market_data_df[rf_name].dropna().to_csv(landing_dir / f"{rf_name}.csv")
+    write_database(tmp_path / "prices.db", market_data_df[market_data_df.columns[2:]])
+
+    study = VaRStudy(EXAMPLE)
+    reference = study.compute("01/01/2024", "2025-01-10")
+    var = study.compute_from_feeds(
+        "01/01/2024",
+        "2025-01-10",
+        market_data_df.index.min().strftime("%d/%m/%Y"),
+        landing_dir,
+        tmp_path / "prices.db",
+    )
+    pd.testing.assert_frame_equal(var, reference)
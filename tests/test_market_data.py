@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from var_engine.market_data import conditional_variance, filter_returns
+
+RETURNS = np.array([[0.1, 0.0], [0.2, 0.1], [np.nan, 0.1], [-0.1, np.nan]])
+SEED = np.array([0.01, 0.02])
+
+
+def test_conditional_variance_EWMA():
+    variance, current = conditional_variance(RETURNS, 0.06, 0.94, np.zeros(2), SEED)
+    # sigma2(t) = 0.06 * r(t-1)^2 + 0.94 * sigma2(t-1), kept on missing returns
+    expected = [[0.01, 0.02], [0.01, 0.0188], [0.0118, 0.018272], [0.0118, 0.01777568]]
+    assert np.allclose(variance, expected)
+    assert np.allclose(current, [0.011692, 0.01777568])
+
+
+def test_conditional_variance_GARCH():
+    omega = np.array([0.001, 0.002])
+    variance, current = conditional_variance(RETURNS, 0.05, 0.9, omega, SEED)
+    # sigma2(t) = omega + 0.05 * r(t-1)^2 + 0.9 * sigma2(t-1)
+    expected = [[0.01, 0.02], [0.0105, 0.02], [0.01245, 0.0205], [0.01245, 0.02095]]
+    assert np.allclose(variance, expected)
+    assert np.allclose(current, [0.012705, 0.02095])
+
+
+def filtered_returns(make_risk_factor, target_date=None, edit=None):
+    dict_rf = {name: make_risk_factor(name, seed) for seed, name in enumerate("XY")}
+    if edit:
+        edit(dict_rf)
+    filter_returns(dict_rf, "EWMA", target_date)
+    return np.stack([rf.get_data()["returns"].values for rf in dict_rf.values()])
+
+
+def test_filter_returns_no_look_ahead(make_risk_factor):
+    dates = make_risk_factor("X", 0).get_data().index
+    target_date = dates[200]
+
+    def shock_after_target(dict_rf):
+        for rf in dict_rf.values():
+            rf.get_data().loc[dates > target_date, "returns"] *= 10
+
+    reference = filtered_returns(make_risk_factor, target_date)
+    shocked = filtered_returns(make_risk_factor, target_date, shock_after_target)
+    assert np.allclose(reference[:, :201], shocked[:, :201])
+
+    # Last date by default
+    assert np.allclose(
+        filtered_returns(make_risk_factor),
+        filtered_returns(make_risk_factor, dates[-1]),
+    )
+    with pytest.raises(AssertionError, match="before the filtering target date"):
+        filtered_returns(make_risk_factor, dates[0] - np.timedelta64(1, "D"))
+
+
+def test_filter_returns_filled_data(make_risk_factor):
+    # A filled return (quality 0) does not update the volatility
+    def fill(value):
+        def edit(dict_rf):
+            data = dict_rf["X"].get_data()
+            data.iloc[100, data.columns.get_loc("returns")] = value
+            data.iloc[100, data.columns.get_loc("quality")] = 0
+
+        return edit
+
+    small = filtered_returns(make_risk_factor, edit=fill(0.0))
+    large = filtered_returns(make_risk_factor, edit=fill(0.5))
+    scale = small[0] / make_risk_factor("X", 0).get_data()["returns"].values
+    assert np.allclose(np.delete(small, 100, axis=1), np.delete(large, 100, axis=1))
+    # Same variance before and after the filled date
+    assert np.isclose(large[0, 100] / 0.5, scale[101])
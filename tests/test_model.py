@@ -0,0 +1,205 @@
+import gc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from var_engine.model import Graph, Node, QualityMask, Sensitivity
+
+DATES = pd.date_range("2023-01-02", periods=300, freq="D", name="Date")
+
+
+def create_graph():
+    root = Node("root", [], None)
+    return Graph("test", root, {"root": root})
+
+
+def test_quality_mask():
+    rng = np.random.default_rng(0)
+    quality = rng.integers(0, 2, size=(len(DATES), 21))
+    mask = QualityMask(DATES, 21)
+    assert mask.bits.shape == (len(DATES), 3)  # 21 bits packed in 3 bytes
+    for bit in range(21):
+        mask.set_quality(bit, DATES[::-1], quality[::-1, bit])  # Any date order
+
+    assert (mask.unpack(DATES) == quality).all()
+    rf_counts = {0: 2, 7: 1, 8: 3, 20: 1}
+    expected = sum(quality[:, bit] * count for bit, count in rf_counts.items())
+    assert (mask.count(DATES[10:20], rf_counts) == expected[10:20]).all()
+
+
+def test_kahan_summation():
+    rng = np.random.default_rng(0)
+    contributions = rng.normal(scale=1e4, size=(2000, 50))
+    contributions[::2] += 1e6  # Large offsets, cancelled below
+    contributions[1::2] -= 1e6
+    contributions = contributions.astype(np.float32)
+    exact = contributions.astype(np.float64).sum(axis=0)
+
+    naive = np.zeros(50, dtype=np.float32)
+    PnL = None
+    for values in contributions:
+        naive += values
+        PnL = Node._aggregate_PnL(PnL, pd.DataFrame({"PnL": values}, index=DATES[:50]))
+    assert PnL["PnL"].dtype == np.float32
+    kahan_error = np.abs(PnL["PnL"].values - exact).max()
+    assert kahan_error < np.abs(naive - exact).max() / 10
+
+
+def test_weighted_VaR_equal_weights():
+    graph = create_graph()
+    PnL = np.random.default_rng(0).normal(size=250)
+    VaR = graph.compute_VaR_from_PnL(PnL)
+    graph.set_scenario_weights(1.0)
+    assert np.isclose(graph.compute_VaR_from_PnL(PnL), VaR)
+
+
+def test_weighted_VaR_dominant_recent_loss():
+    graph = create_graph()
+    PnL = np.random.default_rng(0).uniform(-1, 1, size=100)
+    PnL[-1] = -50  # Most recent date, about 10% of the weight with decay 0.9
+    assert graph.compute_VaR_from_PnL(PnL) < 1
+    graph.set_scenario_weights(0.9)
+    assert np.isclose(graph.compute_VaR_from_PnL(PnL), 50)
+
+
+def test_weighted_VaR_two_scenarios():
+    graph = create_graph()
+    PnL = np.array([-9.45, -2.0])
+    VaR = []
+    for decay in (0.01, 0.5, 0.99):
+        graph.set_scenario_weights(decay)
+        VaR.append(graph.compute_VaR_from_PnL(PnL))
+    assert VaR[0] < VaR[1] < VaR[2]
+
+
+def test_subgraph_edits_update_owner(tree, make_node, make_risk_factor):
+    graph = tree
+    graph.compute_PnL()
+    before = graph.compute_VaR_on_date("2023-10-01")
+    subgraph = graph.get_subgraph_from("A")
+    nested = subgraph.get_subgraph_from("A1")
+    assert nested is graph.get_subgraph_from("A1")
+
+    new_node = make_node("X", [], make_risk_factor("RF4", 4))
+    new_node.sensitivities.sensitivities[0][2] = 1e6
+    subgraph.add_node(new_node, "A1")
+    assert "X" in graph.nodes and "X" in subgraph.nodes and "X" in nested.nodes
+    assert graph.is_descendant("X", "A") and subgraph.is_descendant("X", "A1")
+    assert not graph.root.has_PnL()  # Outdated PnL released up to the root
+
+    graph.compute_PnL()
+    assert graph.compute_VaR_on_date("2023-10-01")[0] > before[0]
+
+    graph.remove_node("X")
+    assert "X" not in graph.nodes and "X" not in subgraph.nodes
+    assert "X" not in nested.nodes
+    graph.compute_PnL()
+    assert np.isclose(graph.compute_VaR_on_date("2023-10-01")[0], before[0])
+
+    # A removed subtree is no longer cached
+    graph.remove_node("A")
+    assert "A1" not in graph.nodes and "A1" not in graph._subgraphs
+
+
+def test_retention_requested(tree):
+    tree.set_retention("requested", ["A1"])
+    tree.compute_PnL()
+    kept = {name for name, node in tree.nodes.items() if node.has_PnL()}
+    assert kept == {"root", "A1"}
+
+
+def test_retention_spill(tree, tmp_path):
+    tree.compute_PnL()
+    reference = {name: node.PnL.copy() for name, node in tree.nodes.items()}
+    for node in tree.nodes.values():
+        node.release_PnL()
+
+    tree.set_retention("spill", spill_dir=tmp_path)
+    tree.compute_PnL()
+    spilled = {path.stem for path in tmp_path.iterdir()}
+    assert spilled == {"A", "A1", "A2", "B"}
+    for name, node in tree.nodes.items():
+        assert (node._spilled_PnL is not None) == (name in spilled)
+        pd.testing.assert_frame_equal(node.PnL, reference[name], check_freq=False)
+
+
+def test_subgraph_recomputes_released_PnL(tree):
+    tree.set_retention("requested")
+    tree.compute_PnL()
+    assert not tree.get_node("A").has_PnL()
+
+    subgraph = tree.get_subgraph_from("A")
+    assert subgraph.retention == "requested"
+    assert tree.get_node("A").has_PnL()
+    assert not tree.get_node("A1").has_PnL()  # Released again by the policy
+    VaR, _ = subgraph.compute_VaR_on_date(datetime(2023, 10, 1))
+    assert VaR > 0
+
+
+def test_spill_directory_cleanup(make_node, make_risk_factor):
+    def create_spilled_graph():
+        child = make_node("child", [], make_risk_factor("RF1", 1))
+        root = make_node("root", [child])
+        graph = Graph("test", root, {"root": root, "child": child})
+        graph.set_retention("spill")
+        graph.compute_PnL()
+        assert (graph.spill_dir / "child.pnl").exists()
+        return graph
+
+    # Retention changed: spilled PnL released, directory removed
+    graph = create_spilled_graph()
+    spill_dir = graph.spill_dir
+    graph.set_retention("all")
+    assert not spill_dir.exists()
+    assert not graph.get_node("child").has_PnL()
+
+    # Graph dropped
+    graph = create_spilled_graph()
+    spill_dir = graph.spill_dir
+    del graph
+    gc.collect()
+    assert not spill_dir.exists()
+
+
+def test_taylor_expansion_PnL(make_risk_factor):
+    rf1, rf2 = make_risk_factor("RF1", 1), make_risk_factor("RF2", 2)
+    sensitivity = Sensitivity("N")
+    sensitivity.add_risk_factor(rf1, {"Type": "Delta"}, 100.0)
+    sensitivity.add_risk_factor(rf1, {"Type": "Gamma"}, 5000.0)
+    sensitivity.add_risk_factor(rf2, {"Type": "Vega"}, -40.0)
+    sensitivity.add_risk_factor(rf1, {"Type": "CrossGamma", "RF2": rf2}, 3000.0)
+    PnL = Node("N", [], sensitivity).compute_sensitivity_PnL()
+
+    r1, r2 = rf1.get_data()["returns"], rf2.get_data()["returns"]
+    expected = 100 * r1 + 0.5 * 5000 * r1**2 - 40 * r2 + 3000 * r1 * r2
+    assert np.allclose(PnL["PnL"], expected, rtol=0, atol=1e-12)
+
+    # The cross gamma counts once on each of its risk factors
+    q1, q2 = rf1.get_data()["quality"], rf2.get_data()["quality"]
+    assert (PnL["quality"] == 3 * q1 + 2 * q2).all()
+    assert (PnL["qt"] == 5).all()
+
+
+def test_first_order_PnL_in_sensitivity_order(make_risk_factor):
+    # Several deltas on one risk factor are not grouped: the PnL is the sum of
+    # one PnL per sensitivity, bit for bit
+    rf1, rf2 = make_risk_factor("RF1", 1), make_risk_factor("RF2", 2)
+    values = [(rf1, 100.0), (rf2, -100.0), (rf1, -500.0), (rf1, -10.0)]
+    sensitivity = Sensitivity("N")
+    for rf, val in values:
+        sensitivity.add_risk_factor(rf, {"Type": "Delta"}, val)
+    PnL = Node("N", [], sensitivity).compute_sensitivity_PnL()
+
+    expected = np.zeros(len(PnL))
+    for rf, val in values:
+        expected += rf.get_data()["returns"].values * val
+    assert (PnL["PnL"].values == expected).all()
+
+
+def test_cross_gamma_without_RF2(make_risk_factor):
+    sensitivity = Sensitivity("N")
+    sensitivity.add_risk_factor(make_risk_factor("RF1", 1), {"Type": "CrossGamma"}, 1.0)
+    with pytest.raises(AssertionError, match="RF2"):
+        Node("N", [], sensitivity).compute_sensitivity_PnL()
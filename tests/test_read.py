@@ -0,0 +1,35 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from var_engine.read import read_input_file
+
+EXAMPLE = Path(__file__).parents[1] / "var_engine/data/template/example.xlsx"
+
+
+def write_input_file(path: Path, rf2: str) -> Path:
+    # Example workbook with a cross gamma row in the Risk tab
+    sheets = pd.read_excel(EXAMPLE, sheet_name=None)
+    cross_gamma = {"NodeName": "N5", "RF": "TotalEnergy", "Type": "CrossGamma"}
+    sheets["Risk"] = pd.concat(
+        [sheets["Risk"], pd.DataFrame([{**cross_gamma, "Val": 10, "RF2": rf2}])]
+    )
+    with pd.ExcelWriter(path) as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+    return path
+
+
+def test_read_RF2(tmp_path):
+    # Optional column: empty when missing
+    sensitivities_df = read_input_file(EXAMPLE)[3]
+    assert (sensitivities_df["RF2"] == "").all()
+
+    sensitivities_df = read_input_file(
+        write_input_file(tmp_path / "in.xlsx", "Hermes")
+    )[3]
+    assert list(sensitivities_df["RF2"].unique()) == ["", "Hermes"]
+
+    with pytest.raises(AssertionError, match="Unknown in  tab MD"):
+        read_input_file(write_input_file(tmp_path / "in.xlsx", "Unknown"))
@@ -0,0 +1,69 @@
+import json
+import threading
+from datetime import datetime
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from var_engine.service import WhatIfService, create_server
+
+
+@pytest.fixture
+def service(tree, tree_market_data):
+    tree.compute_PnL()
+    return WhatIfService(tree, tree_market_data, "2023-10-01", cache_size=2)
+
+
+def post(url: str, content: dict):
+    request = Request(url, data=json.dumps(content).encode(), method="POST")
+    try:
+        with urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except HTTPError as error:
+        return error.code, json.loads(error.read())
+
+
+def test_what_if(service):
+    result = service.what_if("A1", [{"RF": "RF1", "Type": "Delta", "Val": 0}])
+    assert np.isclose(result["node_VaR_post"], result["node_VaR_pre"])
+    assert np.isclose(result["root_VaR_post"], result["root_VaR_pre"])
+    assert np.isclose(
+        result["root_VaR_pre"],
+        service.graph.compute_VaR_on_date(datetime(2023, 10, 1))[0],
+    )
+
+    # Bounded cache of windows
+    for date in ("2023-09-01", "2023-09-02", "2023-09-03"):
+        service.get_window("A1", pd.Timestamp(date))
+    assert len(service.windows) == 2
+
+
+def test_handler(service):
+    server = create_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with urlopen(f"{url}/health") as response:
+            assert json.loads(response.read())["status"] == "ok"
+
+        sensitivities = [{"RF": "RF2", "Type": "Delta", "Val": 500}]
+        code, result = post(
+            f"{url}/whatif", {"node": "A", "sensitivities": sensitivities}
+        )
+        assert code == 200 and result["node"] == "A"
+
+        for request in (
+            {"node": "A", "sensitivities": []},
+            {"node": "Z", "sensitivities": sensitivities},
+            {"node": "A", "sensitivities": [{"RF": "RF9", "Val": 1}]},
+            {"node": "A"},
+        ):
+            code, result = post(f"{url}/whatif", request)
+            assert code == 400 and "error" in result
+    finally:
+        server.shutdown()
+        server.server_close()
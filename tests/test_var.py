@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from var_engine.var_study import VaRStudy
+
+EXAMPLE = Path(__file__).parents[1] / "var_engine/data/template/example.xlsx"
+
+
+def reference_VaR_on_date(graph, date: datetime):
+    """
+    VaR and confidence of the first implementation of
+    Graph.compute_VaR_on_date, copied unchanged
+    """
+    PnL = graph.get_root().PnL
+    date += timedelta(days=1)
+    PnL_filter = PnL[(PnL.index <= date) & (PnL.index > date - graph.window)]
+
+    PnL_filter_serie = PnL_filter["PnL"].sort_values(ascending=False)
+
+    if len(PnL_filter_serie) > 1:
+        step = 100 / (len(PnL_filter_serie) - 1)
+        PnL_filter_serie.index = PnL_filter_serie.reset_index().index * step
+        PnL_filter_serie[graph.percentile * 100] = None
+        PnL_filter_serie = PnL_filter_serie.interpolate(method="index")
+        VaR = max(-float(PnL_filter_serie[graph.percentile * 100]), 0)
+
+        confidence_data = float(PnL_filter["quality"].sum() / PnL_filter["qt"].sum())
+        confidence_size = min(len(PnL_filter_serie), 100) / 100
+        confidence = (confidence_data + confidence_size) / 2
+
+    elif len(PnL_filter_serie) > 0:
+        VaR = max(-float(PnL_filter_serie.iloc[0]), 0)
+        confidence = 0
+
+    else:
+        VaR = 0
+        confidence = 0
+
+    return VaR, confidence
+
+
+@pytest.fixture(scope="module")
+def graph():
+    study = VaRStudy(EXAMPLE)
+    study.compute("01/01/2024", "2024-01-10")
+    return study.get_graph()
+
+
+@pytest.mark.parametrize(
+    "percentile, window", [(0.95, 365), (0.99, 30), (0.9, 30), (0.9, 7), (0.75, 5)]
+)
+def test_compute_VaR_between(graph, percentile, window):
+    graph.set_parameters(percentile, window)
+    VaR_df = graph.compute_VaR_between("01/01/2024", "2025-01-10")
+    reference = pd.DataFrame(
+        [reference_VaR_on_date(graph, date) for date in VaR_df.index],
+        columns=["VaR", "confidence"],
+        index=VaR_df.index,
+    )
+    np.testing.assert_array_equal(VaR_df.values, reference.values)
+
+
+def test_float32_precision():
+    study = VaRStudy(EXAMPLE)
+    reference = study.compute("01/01/2024", "2025-01-10")
+    var = study.compute("01/01/2024", "2025-01-10", precision="float32")
+    assert study.get_graph().get_root().PnL["PnL"].dtype == np.float32
+    assert (var["confidence"] == reference["confidence"]).all()
+
+    deviation = study.validate_precision("01/01/2024", "2025-01-10")
+    assert 0 < deviation < 1e-2
+
+
+def test_filtering_on_one_date():
+    study = VaRStudy(EXAMPLE)
+    with pytest.raises(AssertionError, match="same start and end date"):
+        study.compute("01/01/2024", "2024-06-03", filtering="EWMA")
+
+    var = study.compute("2024-06-03", "2024-06-03", filtering="EWMA")
+    assert list(var.index) == [pd.Timestamp("2024-06-03")]
@@ -1,4 +1,4 @@
-from typing import Dict, Type
+from typing import Dict, List, Type
 
 import pandas as pd
 
@@ -80,19 +80,34 @@ def __parse_tree_structure(df: pd.DataFrame) -> dict:
     return layer_tree
 
 
+def create_sensitivity(
+    name: str, list_sensi: List[dict], market_data: dict
+) -> Sensitivity:
+    """
+    Build a Sensitivity from rows of the Risk tab (RF, Type, Val, RF2 keys)
+    """
+    new_sensi = Sensitivity(name)
+    for sensi in list_sensi:
+        dict_metadata = sensi.copy()
+        assert sensi["RF"] in market_data.keys(), f"Missing market data: {sensi['RF']}"
+        val = float(sensi["Val"])
+        rf = market_data[sensi["RF"]]
+        dict_metadata.pop("NodeName", None)
+        del dict_metadata["RF"]
+        del dict_metadata["Val"]
+        if dict_metadata.get("RF2"):  # Second risk factor of cross gammas
+            dict_metadata["RF2"] = market_data[dict_metadata["RF2"]]
+        new_sensi.add_risk_factor(rf, dict_metadata, val)
+    return new_sensi
+
+
 def __create_node_sensitivities(nodename: str, df: pd.DataFrame, market_data: dict):
     df_filter = df.loc[df.NodeName == nodename]
     list_sensi = df_filter.to_dict("records")
     if len(list_sensi) > 0:
-        new_sensi = Sensitivity(f"{nodename}_sensibility")
-        for sensi in list_sensi:
-            dict_metadata = sensi.copy()
-            val = sensi["Val"]
-            rf = market_data[sensi["RF"]]
-            del dict_metadata["NodeName"]
-            del dict_metadata["RF"]
-            del dict_metadata["Val"]
-            new_sensi.add_risk_factor(rf, dict_metadata, val)
+        new_sensi = create_sensitivity(
+            f"{nodename}_sensibility", list_sensi, market_data
+        )
     else:
         new_sensi = None
 
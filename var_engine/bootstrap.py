@@ -0,0 +1,135 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from var_engine.default_config import (
+    BOOTSTRAP_BLOCK,
+    BOOTSTRAP_CHUNK,
+    BOOTSTRAP_LEVEL,
+    BOOTSTRAP_RESAMPLES,
+    BOOTSTRAP_SEED,
+)
+from var_engine.model import Graph
+
+
+def block_bootstrap_VaR(
+    PnL: np.ndarray,
+    percentile: float,
+    nb_resamples: int,
+    block_size: int,
+    level: float,
+    rng: np.random.Generator,
+    brw_decay: float = None,
+) -> Tuple[float, float]:
+    """
+    Confidence interval of the VaR of one PnL window (sorted by date)
+
+    All resamples are drawn at once as a (resamples x scenarios) index
+    array made of blocks of consecutive scenarios (moving block bootstrap).
+    The VaR of each resample is computed as in Graph.compute_VaR_from_PnL:
+    with a BRW decay, each drawn scenario keeps the weight of its date.
+    """
+    nb_scenarios = len(PnL)
+    if nb_scenarios == 0:
+        return 0.0, 0.0
+    if nb_scenarios == 1:
+        VaR = max(-float(PnL[0]), 0)
+        return VaR, VaR
+
+    block_size = min(block_size, nb_scenarios)
+    nb_blocks = -(-nb_scenarios // block_size)  # Ceil
+    starts = rng.integers(
+        0, nb_scenarios - block_size + 1, size=(nb_resamples, nb_blocks)
+    )
+    indices = (starts[:, :, None] + np.arange(block_size)).reshape(nb_resamples, -1)
+    samples = PnL[indices[:, :nb_scenarios]]
+
+    if brw_decay:
+        ages = np.arange(nb_scenarios)[::-1]
+        weights = (brw_decay**ages)[indices[:, :nb_scenarios]]
+        VaR = Graph.weighted_VaR(samples, weights, percentile)
+    else:
+        VaR = Graph.sorted_VaR(samples, percentile)
+    lower, upper = np.quantile(VaR, [(1 - level) / 2, (1 + level) / 2])
+    return float(lower), float(upper)
+
+
+def _bootstrap_chunk(
+    windows: List[np.ndarray],
+    seeds: List[np.random.SeedSequence],
+    percentile: float,
+    nb_resamples: int,
+    block_size: int,
+    level: float,
+    brw_decay: float,
+) -> List[Tuple[float, float]]:
+    # Run in a worker process: one random stream per date
+    return [
+        block_bootstrap_VaR(
+            PnL,
+            percentile,
+            nb_resamples,
+            block_size,
+            level,
+            np.random.default_rng(seed),
+            brw_decay,
+        )
+        for PnL, seed in zip(windows, seeds)
+    ]
+
+
+def bootstrap_VaR_between(
+    graph: Graph,
+    start_date: str,
+    end_date: str,
+    nb_resamples: int = BOOTSTRAP_RESAMPLES,
+    block_size: int = BOOTSTRAP_BLOCK,
+    level: float = BOOTSTRAP_LEVEL,
+    seed: int = BOOTSTRAP_SEED,
+    nb_workers: int = None,
+) -> pd.DataFrame:
+    """
+    Bootstrap confidence intervals of the VaR between two dates
+
+    Dates are split in chunks spread across a process pool ('nb_workers'
+    processes, all cores by default, 1 to stay in the current process).
+    Each date has its own random stream spawned from 'seed', so results do
+    not depend on the chunks nor on the number of workers.
+
+    Output columns: VaR_lower, VaR_upper (indexed by date, as
+    Graph.compute_VaR_between)
+    """
+    print("\nBootstrap VaR confidence intervals")
+    assert 0 < level < 1, "Level must be a float between 0 and 1"
+    list_of_dates = graph.get_dates_between(start_date, end_date)
+    starts, ends = graph.get_window_bounds(list_of_dates)
+    PnL = graph.get_root().get_PnL_axis()[1]
+    windows = [PnL[start:end] for start, end in zip(starts, ends)]
+    seeds = np.random.SeedSequence(seed).spawn(len(list_of_dates))
+
+    chunks = [
+        (
+            windows[i : i + BOOTSTRAP_CHUNK],
+            seeds[i : i + BOOTSTRAP_CHUNK],
+            graph.percentile,
+            nb_resamples,
+            block_size,
+            level,
+            graph.brw_decay,
+        )
+        for i in range(0, len(list_of_dates), BOOTSTRAP_CHUNK)
+    ]
+    if nb_workers == 1:
+        results = [_bootstrap_chunk(*chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=nb_workers) as executor:
+            results = list(executor.map(_bootstrap_chunk, *zip(*chunks)))
+
+    interval_df = pd.DataFrame(
+        [bounds for result in results for bounds in result],
+        columns=["VaR_lower", "VaR_upper"],
+    )
+    interval_df["date"] = list_of_dates
+    return interval_df.set_index("date")
@@ -1,8 +1,11 @@
+from datetime import timedelta
 from pathlib import Path
 
 import click
 
 from var_engine import plot_VaR
+from var_engine.default_config import SERVICE_HOST, SERVICE_PORT
+from var_engine.service import WhatIfService, serve
 from var_engine.var_study import VaRStudy
 
 
@@ -17,10 +20,27 @@ def cli():
 @click.option("-ed", "--end_date", "end_date", required=True, type=click.DateTime())
 @click.option("-w", "--window", "window", default=365, type=int)
 @click.option("-p", "--percentile", "percentile", default=0.95, type=float)
+@click.option(
+    "--precision",
+    "precision",
+    default="float64",
+    type=click.Choice(["float64", "float32"]),
+)
+@click.option(
+    "--filtering",
+    "filtering",
+    default=None,
+    type=click.Choice(["EWMA", "GARCH"]),
+)
+@click.option("--brw_decay", "brw_decay", default=None, type=float)
 def var(input_file, **kwargs):
     input_file = Path(input_file)
     if not input_file.exists():
         raise click.BadParameter(f"Input file does not exist: {input_file}")
+    if kwargs["filtering"] and kwargs["start_date"] != kwargs["end_date"]:
+        raise click.BadParameter(
+            "--filtering gives the VaR of one date: use the same start and end date"
+        )
 
     my_study = VaRStudy(input_file)
 
@@ -30,6 +50,9 @@ def var(input_file, **kwargs):
         end_date=kwargs["end_date"].strftime(format='%Y-%m-%d'),
         window=kwargs["window"],
         percentile=kwargs["percentile"],
+        precision=kwargs["precision"],
+        filtering=kwargs["filtering"],
+        brw_decay=kwargs["brw_decay"],
     )
 
     # Print the result
@@ -37,7 +60,37 @@ def var(input_file, **kwargs):
     fig.show()
 
 
+@click.command("whatif_server")
+@click.argument("input_file", type=click.Path())
+@click.option("-d", "--date", "date", required=True, type=click.DateTime())
+@click.option("-w", "--window", "window", default=365, type=int)
+@click.option("-p", "--percentile", "percentile", default=0.95, type=float)
+@click.option("--host", "host", default=SERVICE_HOST, type=str)
+@click.option("--port", "port", default=SERVICE_PORT, type=int)
+def whatif(input_file, **kwargs):
+    input_file = Path(input_file)
+    if not input_file.exists():
+        raise click.BadParameter(f"Input file does not exist: {input_file}")
+
+    my_study = VaRStudy(input_file)
+    date = kwargs["date"].strftime(format='%Y-%m-%d')
+
+    # Compute PnL (and the VaR of the day before)
+    # Note: the start date is parsed day first, the end date is not
+    my_study.compute(
+        start_date=(kwargs["date"] - timedelta(days=1)).strftime(format='%d/%m/%Y'),
+        end_date=date,
+        window=kwargs["window"],
+        percentile=kwargs["percentile"],
+    )
+
+    # Serve what-if requests
+    service = WhatIfService(my_study.get_graph(), my_study.get_market_data(), date)
+    serve(service, kwargs["host"], kwargs["port"])
+
+
 cli.add_command(var)
+cli.add_command(whatif)
 
 if __name__ == "__main__":
     cli()
@@ -19,3 +19,69 @@ PERCENTILE = 0.95
 
 # Adjustemt for returns next to 0
 ADJUSTMENT_REL = 1e-6
+
+# PnL retention policy for intermediate nodes
+"""
+all       -> every node keeps its PnL in memory
+requested -> only the root and the requested nodes keep their PnL
+spill     -> non requested nodes are spilled to memory-mapped files
+"""
+PNL_RETENTION = "all"
+
+# Precision mode
+"""
+float64 -> returns, PnL and quality stored as float64 / int64 columns
+float32 -> float32 returns and PnL (Kahan summation for the aggregation),
+           quality packed as a bitmask (one bit per risk factor per date)
+"""
+PRECISION = "float64"
+
+# Market data ingestion from local feeds
+"""
+Landing directory: one file per risk factor named '<RF>.csv' or '<RF>.parquet'
+with a 'Date' column and a value column.
+Price database (SQLite): table PRICE_TABLE with 'Date', 'RF' and 'Value' columns.
+"""
+PRICE_TABLE = "prices"
+MAX_CONCURRENCY = 4
+
+# Filtered historical simulation
+"""
+EWMA  -> sigma2(t) = DECAY * sigma2(t-1) + (1 - DECAY) * r(t-1)^2
+GARCH -> sigma2(t) = omega + ALPHA * r(t-1)^2 + BETA * sigma2(t-1)
+         (omega from variance targeting)
+Each return is rescaled to the volatility of the VaR date d:
+r(t) * sigma(d) / sigma(t), so filtered returns only give the VaR of d
+Filled market data (quality 0) does not update the volatility
+"""
+EWMA_DECAY = 0.94
+GARCH_ALPHA = 0.05
+GARCH_BETA = 0.94
+
+# Sensitivity types (Type column of the Risk tab)
+"""
+PnL of a scenario (Taylor expansion on the returns r):
+    first order (Delta, Vega on a volatility risk factor, ...): val * r
+    GAMMA_TYPE: 1/2 * val * r^2
+    CROSS_GAMMA_TYPE: val * r * r2 (second risk factor in the RF2 column)
+Any other type is first order.
+"""
+GAMMA_TYPE = "Gamma"
+CROSS_GAMMA_TYPE = "CrossGamma"
+
+# Bootstrap confidence intervals of the VaR
+"""
+Moving block bootstrap of the PnL window of each date: BOOTSTRAP_RESAMPLES
+resamples made of blocks of BOOTSTRAP_BLOCK consecutive scenarios, interval
+at BOOTSTRAP_LEVEL. Dates are sent by chunks of BOOTSTRAP_CHUNK to the pool.
+"""
+BOOTSTRAP_RESAMPLES = 1000
+BOOTSTRAP_BLOCK = 5
+BOOTSTRAP_LEVEL = 0.9
+BOOTSTRAP_SEED = 0
+BOOTSTRAP_CHUNK = 50
+
+# What-if VaR service (local HTTP server)
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+SERVICE_CACHE_SIZE = 256  # (node, date) PnL windows kept in memory
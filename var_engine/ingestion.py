@@ -0,0 +1,173 @@
+import asyncio
+import sqlite3
+from contextlib import closing
+from importlib.util import find_spec
+from pathlib import Path
+from typing import Callable, Dict, List, Set, Union
+
+import pandas as pd
+
+from var_engine.default_config import MAX_CONCURRENCY, PRICE_TABLE
+from var_engine.market_data import load_risk_factor_data
+from var_engine.model import Graph, Node, RiskFactor
+
+
+def find_feeds(
+    rf_names: List[str],
+    landing_dir: Union[str, Path] = None,
+    db_path: Union[str, Path] = None,
+) -> Dict[str, Path]:
+    """
+    Locate the source of each risk factor
+
+    Files of the landing directory ('<RF>.csv' or '<RF>.parquet') come first,
+    the price database is used for the remaining risk factors. Parquet files
+    need pyarrow (or fastparquet), not installed with the package.
+    """
+    feeds = {}
+    if landing_dir:
+        for path in sorted(Path(landing_dir).iterdir()):
+            if path.suffix in (".csv", ".parquet") and path.stem in rf_names:
+                feeds[path.stem] = path
+
+    # Parquet is read by pandas through an optional engine, checked up front
+    parquet = [path.name for path in feeds.values() if path.suffix == ".parquet"]
+    assert (
+        len(parquet) == 0 or find_spec("pyarrow") or find_spec("fastparquet")
+    ), f"Reading {','.join(parquet)} needs pyarrow (pip install pyarrow)"
+
+    missing = [rf_name for rf_name in rf_names if rf_name not in feeds.keys()]
+    assert (
+        len(missing) == 0 or db_path is not None
+    ), f"Missing market data: {','.join(missing)}"
+    for rf_name in missing:
+        feeds[rf_name] = Path(db_path)
+    return feeds
+
+
+def read_feed(rf_name: str, path: Path) -> pd.Series:
+    """
+    Read the market data of one risk factor (CSV, Parquet or SQLite)
+    """
+    if path.suffix == ".csv":
+        df = pd.read_csv(path)
+    elif path.suffix == ".parquet":
+        df = pd.read_parquet(path)
+    else:
+        query = f"SELECT Date, Value FROM {PRICE_TABLE} WHERE RF = ?"
+        with closing(sqlite3.connect(path)) as con:
+            df = pd.read_sql_query(query, con, params=(rf_name,))
+
+    assert "Date" in df.columns, f"'Date' column is missing in {path.name}"
+    values = [col for col in df.columns if col != "Date"]
+    assert (
+        rf_name in values or len(values) == 1
+    ), f"Cannot find the value column of {rf_name} in {path.name}"
+    col = rf_name if rf_name in values else values[0]
+    assert df.shape[0] > 0, f"No market data for {rf_name} in {path.name}"
+
+    df["Date"] = pd.to_datetime(df["Date"])
+    return df.set_index("Date")[col].astype(float).rename(rf_name)
+
+
+async def ingest_market_data(
+    dict_rf: Dict[str, RiskFactor],
+    calendar: pd.Index,
+    feeds: Dict[str, Path],
+    max_concurrency: int = MAX_CONCURRENCY,
+    on_loaded: Callable[[RiskFactor], None] = None,
+):
+    """
+    Read all feeds concurrently (at most 'max_concurrency' at a time)
+
+    Each risk factor is filled as soon as its feed is read, then
+    'on_loaded' is called on it.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def load(rf_object: RiskFactor):
+        async with semaphore:
+            serie = await asyncio.to_thread(
+                read_feed, rf_object.name, feeds[rf_object.name]
+            )
+            serie = pd.DataFrame(index=calendar).join(serie)[rf_object.name]
+            await asyncio.to_thread(load_risk_factor_data, rf_object, serie)
+        print("\tLoaded ", rf_object.name)
+        if on_loaded:
+            on_loaded(rf_object)
+
+    await asyncio.gather(*(load(rf_object) for rf_object in dict_rf.values()))
+
+
+class PnLScheduler:
+    """
+    Launch the PnL aggregation of a sub-tree as soon as all the risk
+    factors it depends on are loaded
+    """
+
+    def __init__(self, _graph: Graph):
+        self.graph: Graph = _graph
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+        # Missing risk factors of each node (nodes in post order, so that
+        # children are always scheduled before their parent)
+        self.missing: Dict[str, Set[str]] = {}
+        self.__collect(self.graph.get_root())
+
+        # Nodes depending on each risk factor
+        self.dependants: Dict[str, List[str]] = {}
+        for node_name, missing in self.missing.items():
+            for rf_name in missing:
+                self.dependants.setdefault(rf_name, []).append(node_name)
+
+    def __collect(self, node: Node) -> Set[str]:
+        missing = set()
+        for child in node.get_children():
+            missing |= self.__collect(child)
+        if node.get_sensitivity():
+            missing |= {rf.name for rf in node.get_sensitivity().get_risk_factors()}
+        self.missing[node.name] = missing
+        return missing
+
+    def risk_factor_loaded(self, rf_name: str):
+        for node_name in self.dependants.get(rf_name, []):
+            missing = self.missing[node_name]
+            missing.discard(rf_name)
+            if len(missing) == 0:
+                self.queue.put_nowait(node_name)
+
+    def close(self):
+        self.queue.put_nowait(None)
+
+    async def run(self):
+        # Nodes are aggregated one at a time, in the order they get ready
+        while True:
+            node_name = await self.queue.get()
+            if node_name is None:
+                break
+            await asyncio.to_thread(self.graph.compute_PnL, False, node_name)
+
+
+async def run_ingestion(
+    graph: Graph,
+    dict_rf: Dict[str, RiskFactor],
+    calendar: pd.Index,
+    feeds: Dict[str, Path],
+    max_concurrency: int = MAX_CONCURRENCY,
+):
+    """
+    Ingest all feeds and aggregate the PnL of the graph while they arrive
+    """
+    scheduler = PnLScheduler(graph)
+    aggregation = asyncio.create_task(scheduler.run())
+    try:
+        await ingest_market_data(
+            dict_rf,
+            calendar,
+            feeds,
+            max_concurrency,
+            on_loaded=lambda rf_object: scheduler.risk_factor_loaded(rf_object.name),
+        )
+    finally:
+        scheduler.close()
+        await aggregation
@@ -1,11 +1,20 @@
 from datetime import datetime
+from typing import Dict, List, Literal, Tuple
 
+import numpy as np
 import pandas as pd
 import pandas_market_calendars as mcal
 from dateutil.parser import parse
 
-from var_engine.default_config import ADJUSTMENT_REL, SHOCK_MAPPING
-from var_engine.model import RiskFactor
+from var_engine.default_config import (
+    ADJUSTMENT_REL,
+    EWMA_DECAY,
+    GARCH_ALPHA,
+    GARCH_BETA,
+    PRECISION,
+    SHOCK_MAPPING,
+)
+from var_engine.model import QualityMask, RiskFactor
 
 
 def generate_shock(s: pd.Series, is_rel=False):
@@ -22,12 +31,179 @@ def generate_shock(s: pd.Series, is_rel=False):
     return df["new_value"]
 
 
+def build_calendar(min_date: datetime, current_date: datetime) -> pd.Index:
+    """
+    Trading days (LSE calendar) between the oldest date and the current date
+    """
+    lse = mcal.get_calendar("LSE")
+    early = lse.schedule(
+        start_date=min_date.strftime("%Y-%m-%d"),
+        end_date=current_date.strftime("%Y-%m-%d"),
+    )
+
+    new_date_list = mcal.date_range(early, frequency='1D')
+
+    return pd.DataFrame(new_date_list.tz_localize(None).date).set_index(0).index
+
+
+def create_risk_factor(rf_name: str, df_mapping: pd.DataFrame) -> RiskFactor:
+    """
+    Create a RiskFactor without data (type and shock type only)
+    """
+    # Define the type of returns computation
+    type_of_product = df_mapping.loc[rf_name].Type
+    shock_type = df_mapping.loc[rf_name].ShockType
+
+    if shock_type not in ("REL", "ABS"):
+        print("\t\tUsing default value for ", type_of_product)
+        shock_type = SHOCK_MAPPING[type_of_product]
+
+    return RiskFactor(rf_name, None, type_of_product, shock_type)
+
+
+def attach_quality_mask(dict_rf: Dict[str, RiskFactor], calendar: pd.Index):
+    """
+    Share one packed quality mask between all risk factors (float32 mode)
+    """
+    quality_mask = QualityMask(pd.DatetimeIndex(calendar), len(dict_rf))
+    for bit, rf_object in enumerate(dict_rf.values()):
+        rf_object.set_quality_mask(quality_mask, bit)
+
+
+def load_risk_factor_data(rf_object: RiskFactor, serie: pd.Series):
+    """
+    Compute the returns of a risk factor from its market data
+
+    'serie' must already be joined on the calendar (NaN for missing dates)
+    """
+    df_rf = pd.DataFrame({rf_object.name: serie})
+
+    # Forward fill (flat interpolation)
+    df_rf["quality"] = 1
+    df_rf.loc[df_rf[rf_object.name].isna(), "quality"] = 0
+    df_rf[rf_object.name] = df_rf[rf_object.name].ffill()
+
+    # Compute the returns
+    is_rel_flag = True if rf_object.shock_type == "REL" else False
+    rf_serie = generate_shock(df_rf[rf_object.name], is_rel_flag)
+
+    rf_dataframe = pd.DataFrame(rf_serie).join(df_rf)
+    rf_dataframe.columns = ["returns", "market_data", "quality"]
+    if rf_object.quality_mask is not None:
+        rf_dataframe["returns"] = rf_dataframe["returns"].astype(np.float32)
+        rf_object.quality_mask.set_quality(
+            rf_object.bit, rf_dataframe.index, rf_dataframe.pop("quality").values
+        )
+    rf_object.set_data(rf_dataframe)
+
+
+def get_quality(list_rf: List[RiskFactor], dates: pd.Index) -> np.ndarray:
+    """
+    Data quality of risk factors on some dates (dates x risk factors)
+
+    In compact precision mode the shared mask is unpacked once, then the
+    columns of the risk factors are selected.
+    """
+    quality_mask = list_rf[0].quality_mask
+    if quality_mask is not None:
+        return quality_mask.unpack(dates)[:, [rf.bit for rf in list_rf]]
+    return np.stack(
+        [rf.get_data()["quality"].reindex(dates).values for rf in list_rf], axis=1
+    )
+
+
+def conditional_variance(
+    returns: np.ndarray,
+    alpha: float,
+    beta: float,
+    omega: np.ndarray,
+    seed: np.ndarray = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Recursive variance of all risk factors at once (dates x risk factors)
+
+    sigma2(t) = omega + alpha * r(t-1)^2 + beta * sigma2(t-1), dates sorted
+    from the oldest to the most recent, missing returns keep the variance.
+    Returns the variance of each date and the current one (next date).
+    """
+    variance = np.empty_like(returns)
+    current = np.nanvar(returns, axis=0) if seed is None else seed
+    for t in range(returns.shape[0]):
+        variance[t] = current
+        squared = returns[t] ** 2
+        current = np.where(
+            np.isnan(squared), current, omega + alpha * squared + beta * current
+        )
+    return variance, current
+
+
+def filter_returns(
+    dict_rf: Dict[str, RiskFactor],
+    method: Literal["EWMA", "GARCH"] = "EWMA",
+    target_date: datetime = None,
+):
+    """
+    Filtered historical simulation: rescale the returns to the volatility
+    of a target date (last date by default)
+
+    All risk factors are treated together on the returns matrix, the returns
+    of each risk factor are replaced by r(t) * sigma(target) / sigma(t).
+    sigma(target) only uses the returns up to the target date, so filtered
+    returns are only valid for the VaR of this date.
+    """
+    assert method in ("EWMA", "GARCH"), "Filtering must be EWMA or GARCH"
+    print("\tFiltering returns with ", method)
+    list_rf = list(dict_rf.values())
+    index = list_rf[0].get_data().index
+    returns = np.stack(
+        [rf.get_data()["returns"].reindex(index).values for rf in list_rf], axis=1
+    ).astype(np.float64)
+    quality = get_quality(list_rf, index)
+    order = np.argsort(index.values, kind="stable")  # Oldest first
+
+    # Filled market data is not an observation of the volatility
+    observed = np.where(quality > 0, returns, np.nan)[order]
+
+    # Known history at the target date (seed and variance targeting)
+    history = np.ones(len(index), dtype=bool)
+    if target_date is not None:
+        history = pd.DatetimeIndex(index[order]) <= pd.Timestamp(target_date)
+    assert history.any(), "No market data before the filtering target date"
+    seed = np.nanvar(observed[history], axis=0)
+
+    if method == "EWMA":
+        alpha, beta, omega = 1 - EWMA_DECAY, EWMA_DECAY, np.zeros(len(list_rf))
+    else:
+        alpha, beta = GARCH_ALPHA, GARCH_BETA
+        omega = (1 - alpha - beta) * seed
+    variance, current = conditional_variance(observed, alpha, beta, omega, seed)
+
+    # Variance after the returns of the target date
+    nb_known = int(history.sum())
+    target = variance[nb_known] if nb_known < len(index) else current
+
+    scale = np.ones_like(variance)
+    np.divide(target, variance, out=scale, where=variance > 0)
+    filtered = np.empty_like(returns)
+    filtered[order] = returns[order] * np.sqrt(scale)
+
+    for i, rf in enumerate(list_rf):
+        rf_data = rf.get_data()
+        rf_data["returns"] = pd.Series(filtered[:, i], index=index).astype(
+            rf_data["returns"].dtype
+        )
+
+
 def prepare_market_data(
     df_md: pd.DataFrame,
     df_mapping: pd.DataFrame,
     current_date: str = datetime.now().strftime("%Y-%m-%d"),
+    precision: Literal["float64", "float32"] = PRECISION,
+    filtering: Literal["EWMA", "GARCH"] = None,
+    filtering_date: datetime = None,
 ):
     print("\nPrepare Market Data")
+    assert precision in ("float64", "float32"), "Precision must be float64 or float32"
     # Output
     dict_res = {}
 
@@ -39,44 +215,25 @@ def prepare_market_data(
     min_date = min(current_index)
 
     # Generate dates from start to end
-    lse = mcal.get_calendar("LSE")
-    early = lse.schedule(
-        start_date=min_date.strftime("%Y-%m-%d"),
-        end_date=current_date.strftime("%Y-%m-%d"),
-    )
-
-    new_date_list = mcal.date_range(early, frequency='1D')
-
-    df_md = pd.DataFrame(new_date_list.tz_localize(None).date).set_index(0).join(df_md)
+    calendar = build_calendar(min_date, current_date)
+    df_md = pd.DataFrame(index=calendar).join(df_md)
 
+    # Create the RiskFactor Objects
     for rf_name in df_md.columns:
-        print("\tTreating ", rf_name)
-
-        # Forward fill (flat interpolation)
-        df_md["quality"] = 1
-        df_md.loc[df_md[rf_name].isna(), "quality"] = 0
-        df_md[rf_name] = df_md[rf_name].ffill()
-        original_serie = df_md[rf_name]
-
-        # Define the type of returns computation
-        type_of_product = df_mapping.loc[rf_name].Type
-        shock_type = df_mapping.loc[rf_name].ShockType
+        dict_res[rf_name] = create_risk_factor(rf_name, df_mapping)
 
-        if shock_type not in ("REL", "ABS"):
-            print("\t\tUsing default value for ", type_of_product)
-            shock_type = SHOCK_MAPPING[type_of_product]
+    # Pack the data quality of all risk factors (one bit per date)
+    if precision == "float32":
+        attach_quality_mask(dict_res, calendar)
 
-        # Compute the returns
-        is_rel_flag = True if shock_type == "REL" else False
-        rf_serie = generate_shock(original_serie, is_rel_flag)
-
-        # Create the RiskFactor Object
-        rf_dataframe = pd.DataFrame(rf_serie).join(df_md[[rf_name, "quality"]])
-        rf_dataframe.columns = ["returns", "market_data", "quality"]
-        rf_object = RiskFactor(rf_name, rf_dataframe, type_of_product, shock_type)
+    for rf_name, rf_object in dict_res.items():
+        print("\tTreating ", rf_name)
+        load_risk_factor_data(rf_object, df_md[rf_name])
 
-        # Add to output dictionnary
-        dict_res[rf_name] = rf_object
+    # Filtered historical simulation (rescaled to the volatility of
+    # 'filtering_date', current date by default)
+    if filtering:
+        filter_returns(dict_res, filtering, filtering_date)
 
     # Output
     return dict_res
@@ -1,10 +1,21 @@
-from datetime import timedelta
-from typing import Dict, List, Literal, Tuple, Type, Union
-
+import shutil
+import tempfile
+import threading
+import weakref
+from pathlib import Path
+from typing import Callable, Dict, List, Literal, Tuple, Type, Union
+
+import numpy as np
 import pandas as pd
 from dateutil.parser import parse
 
-from var_engine.default_config import PERCENTILE, WINDOW
+from var_engine.default_config import (
+    CROSS_GAMMA_TYPE,
+    GAMMA_TYPE,
+    PERCENTILE,
+    PNL_RETENTION,
+    WINDOW,
+)
 from var_engine.utils import save_mmd
 
 
@@ -19,9 +30,70 @@ class RiskFactor:
         self.type: str = _type  # EQ, COM, ...
         self.shock_type: Literal["REL", "ABS"] = _shock_type
 
+        # Packed data quality (compact precision mode only)
+        self.quality_mask: QualityMask = None
+        self.bit: int = None
+
     def get_data(self):
         return self.MarketD
 
+    def set_data(self, _md_df: pd.DataFrame):
+        self.MarketD = _md_df
+
+    def set_quality_mask(self, quality_mask: "QualityMask", bit: int):
+        self.quality_mask = quality_mask
+        self.bit = bit
+
+
+class QualityMask:
+    """
+    Data quality of all risk factors packed as a bitmask
+
+    One bit per risk factor and per date: 1 for a good value, 0 for a
+    filled one. Used in compact precision mode instead of a quality column.
+    """
+
+    def __init__(self, _dates: pd.Index, _nb_rf: int):
+        self.dates: pd.Index = pd.Index(_dates)
+        self.nb_rf: int = _nb_rf
+        self.bits: np.ndarray = np.zeros(
+            (len(self.dates), (_nb_rf + 7) // 8), dtype=np.uint8
+        )
+        # Risk factors sharing a byte may be written from several threads
+        self._lock = threading.Lock()
+
+    def set_quality(self, bit: int, dates: pd.Index, quality: np.ndarray):
+        """
+        Write the quality of one risk factor (filled one at a time)
+        """
+        rows = self.dates.get_indexer(dates)
+        assert (rows >= 0).all(), "Dates missing from the quality mask"
+        byte, mask = bit // 8, np.uint8(1 << (7 - bit % 8))
+        with self._lock:
+            column = self.bits[rows, byte] & ~mask
+            self.bits[rows, byte] = column | np.where(quality > 0, mask, np.uint8(0))
+
+    def count(self, dates: pd.Index, rf_counts: Dict[int, int]) -> np.ndarray:
+        """
+        Quality of each date, each risk factor bit weighted by its count
+        """
+        rows = self.dates.get_indexer(dates)
+        assert (rows >= 0).all(), "Dates missing from the quality mask"
+        # Only the bits of the requested risk factors are extracted, one
+        # column of dates at a time
+        quality = np.zeros(len(rows), dtype=np.int64)
+        for bit, count in rf_counts.items():
+            quality += ((self.bits[rows, bit // 8] >> (7 - bit % 8)) & 1) * count
+        return quality
+
+    def unpack(self, dates: pd.Index) -> np.ndarray:
+        """
+        Quality of all risk factors on some dates (dates x risk factors)
+        """
+        rows = self.dates.get_indexer(dates)
+        assert (rows >= 0).all(), "Dates missing from the quality mask"
+        return np.unpackbits(self.bits[rows], axis=1, count=self.nb_rf)
+
 
 class Sensitivity:
     def __init__(self, _name):
@@ -38,6 +110,65 @@ class Sensitivity:
         new_value = [rf, dict_metadata, val]
         self.sensitivities.append(new_value)
 
+    def get_risk_factors(self) -> List[RiskFactor]:
+        # Risk factors used (RF2 of cross gammas included), without duplicates
+        dict_rf = {}
+        for rf, dict_metadata, _ in self.sensitivities:
+            dict_rf.setdefault(rf.name, rf)
+            rf2 = dict_metadata.get("RF2")
+            if isinstance(rf2, RiskFactor):
+                dict_rf.setdefault(rf2.name, rf2)
+        return list(dict_rf.values())
+
+    def get_taylor_terms(self):
+        """
+        Sensitivities grouped by type, indexed as get_risk_factors
+
+        Output:
+        -------
+
+           - first order sensitivities as sparse (i, value) arrays
+           - gamma values, summed by risk factor
+           - cross gammas as sparse (i, j, value) arrays
+           - number of sensitivities on each risk factor (for data quality)
+        """
+        positions = {rf.name: i for i, rf in enumerate(self.get_risk_factors())}
+        first_i, first_val = [], []
+        gamma = np.zeros(len(positions))
+        counts = np.zeros(len(positions), dtype=np.int64)
+        cross_i, cross_j, cross_val = [], [], []
+
+        for rf, dict_metadata, val in self.sensitivities:
+            i = positions[rf.name]
+            counts[i] += 1
+            sensi_type = str(dict_metadata.get("Type", "")).upper()
+            if sensi_type == GAMMA_TYPE.upper():
+                gamma[i] += val
+            elif sensi_type == CROSS_GAMMA_TYPE.upper():
+                rf2 = dict_metadata.get("RF2")
+                assert isinstance(
+                    rf2, RiskFactor
+                ), f"Second risk factor (RF2) missing for {rf.name} cross gamma"
+                j = positions[rf2.name]
+                counts[j] += 1
+                cross_i.append(i)
+                cross_j.append(j)
+                cross_val.append(val)
+            else:
+                first_i.append(i)
+                first_val.append(val)
+
+        first_order = (
+            np.array(first_i, dtype=np.int64),
+            np.array(first_val, dtype=np.float64),
+        )
+        cross = (
+            np.array(cross_i, dtype=np.int64),
+            np.array(cross_j, dtype=np.int64),
+            np.array(cross_val, dtype=np.float64),
+        )
+        return first_order, gamma, cross, counts
+
     def __str__(self):
         msg = f"Sensitivity: {self.name}\n"
         for sensitivity in self.sensitivities:
@@ -45,6 +176,36 @@ class Sensitivity:
         return msg
 
 
+class SpilledPnL:
+    """
+    PnL vector stored in a memory-mapped file
+
+    The vector is paged back in lazily (by the OS) each time it is read,
+    nothing is kept in memory by this object except the file description.
+    """
+
+    def __init__(self, _path: Union[str, Path], _PnL: pd.DataFrame):
+        self.path: Path = Path(_path)
+        self.length: int = _PnL.shape[0]
+        self.index_name = _PnL.index.name
+        self.columns: List[str] = list(_PnL.columns)
+        self.dtype = np.dtype(
+            [("date", "M8[ns]")] + [(col, _PnL[col].dtype) for col in self.columns]
+        )
+
+        records = np.memmap(self.path, dtype=self.dtype, mode="w+", shape=self.length)
+        records["date"] = _PnL.index.values
+        for col in self.columns:
+            records[col] = _PnL[col].values
+        records.flush()
+        del records
+
+    def load(self) -> pd.DataFrame:
+        records = np.memmap(self.path, dtype=self.dtype, mode="r", shape=self.length)
+        index = pd.DatetimeIndex(records["date"], name=self.index_name)
+        return pd.DataFrame({col: records[col] for col in self.columns}, index=index)
+
+
 class Node:
     def __init__(
         self,
@@ -54,8 +215,15 @@ class Node:
     ):
         self.name: str = _name
 
-        # Profit and Loss Vector
-        self.PnL: pd.DataFrame = None
+        # Profit and Loss Vector (in memory or spilled on disk)
+        self._PnL: pd.DataFrame = None
+        self._spilled_PnL: SpilledPnL = None
+        self._PnL_axis: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray] = None
+
+        # Compact precision mode: the PnL vector is float32 and the quality
+        # is read from the packed mask, weighted by the count of each factor
+        self.quality_mask: QualityMask = None
+        self.rf_counts: Dict[int, int] = {}
 
         # Childrens
         self.children: List[Node] = _children
@@ -63,6 +231,68 @@ class Node:
         # Own sensitivities
         self.sensitivities: Sensitivity = _sensitivities
 
+    # PnL storage
+    @property
+    def PnL(self) -> pd.DataFrame:
+        if self._PnL is None and self._spilled_PnL is not None:
+            return self._spilled_PnL.load()
+        return self._PnL
+
+    @PnL.setter
+    def PnL(self, value: pd.DataFrame):
+        self._PnL = value
+        self._spilled_PnL = None
+        self._PnL_axis = None
+
+    def has_PnL(self) -> bool:
+        # Cheap check, the PnL is not read back from the spill file
+        return self._PnL is not None or self._spilled_PnL is not None
+
+    def release_PnL(self):
+        self.PnL = None
+
+    def spill_PnL(self, directory: Union[str, Path]):
+        if self._PnL is None:
+            return
+        path = Path(directory) / f"{self.name}.pnl"
+        self._spilled_PnL = SpilledPnL(path, self._PnL)
+        self._PnL = None
+        self._PnL_axis = None
+
+    def get_PnL_axis(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        PnL as contiguous arrays on the trading-day axis
+
+        Output:
+        -------
+
+           - dates (sorted)
+           - PnL values
+           - cumulated quality and quantity of data, starting with 0: their
+             sum over rows [start, end) is cum[end] - cum[start]
+
+        Cached while the PnL is in memory.
+        """
+        if self._PnL_axis is not None:
+            return self._PnL_axis
+        PnL = self.PnL
+        assert PnL is not None, f"Compute PnL on {self.name} node before !!!!"
+
+        if self.quality_mask is None:
+            quality, qt = PnL["quality"].values, PnL["qt"].values
+        else:
+            quality = self.quality_mask.count(PnL.index, self.rf_counts)
+            qt = np.full(PnL.shape[0], sum(self.rf_counts.values()))
+        axis = (
+            PnL.index.values,
+            np.ascontiguousarray(PnL["PnL"].values, dtype=np.float64),
+            np.concatenate([[0], np.cumsum(quality)]),
+            np.concatenate([[0], np.cumsum(qt)]),
+        )
+        if self._PnL is not None:
+            self._PnL_axis = axis
+        return axis
+
     # Getter
     def get_children(self):
         return self.children
@@ -93,45 +323,122 @@ class Node:
         return msg
 
     # Computation
-    def compute_PnL(self, re_compute: bool = False) -> pd.Series:
-        if self.PnL is not None and not re_compute:
+    @staticmethod
+    def _aggregate_PnL(df_PnL: pd.DataFrame, new_PnL: pd.DataFrame) -> pd.DataFrame:
+        # Only dates where every PnL is known are kept
+        new_PnL = new_PnL.dropna(how='any')
+        if df_PnL is None:
+            if new_PnL["PnL"].dtype == np.float32:
+                new_PnL = new_PnL.assign(compensation=np.float32(0))
+            return new_PnL
+        df_PnL, new_PnL = df_PnL.align(new_PnL, join="inner", axis=0)
+        if "compensation" not in df_PnL.columns:
+            return df_PnL + new_PnL
+
+        # float32: Kahan summation to limit the rounding errors
+        total = df_PnL["PnL"].values
+        compensation = df_PnL["compensation"].values
+        value = new_PnL["PnL"].values.astype(np.float32) - compensation
+        new_total = total + value
+        return pd.DataFrame(
+            {"PnL": new_total, "compensation": (new_total - total) - value},
+            index=df_PnL.index,
+        )
+
+    def _add_quality(self, quality_mask: QualityMask, rf_counts: Dict[int, int]):
+        assert (
+            self.quality_mask is None or self.quality_mask is quality_mask
+        ), "All risk factors must share the same precision mode"
+        self.quality_mask = quality_mask
+        for bit, count in rf_counts.items():
+            self.rf_counts[bit] = self.rf_counts.get(bit, 0) + count
+
+    def compute_sensitivity_PnL(self) -> pd.DataFrame:
+        """
+        PnL of the own sensitivities of the node (Taylor expansion)
+
+        All scenarios are evaluated at once: one array operation per first
+        order sensitivity (in the order of the Risk tab, so that results do
+        not depend on the grouping), one for gammas and one for the sparse
+        cross gammas.
+        """
+        list_rf = self.sensitivities.get_risk_factors()
+        assert len(list_rf) > 0, f"No sensitivities on {self.name} node"
+        first_order, gamma, cross, counts = self.sensitivities.get_taylor_terms()
+        index = list_rf[0].get_data().index
+        returns = np.stack(
+            [rf.get_data()["returns"].reindex(index).values for rf in list_rf], axis=1
+        )
+        dtype = returns.dtype  # float32 in compact precision mode
+
+        # First order terms added one sensitivity at a time, in the order of
+        # the Risk tab: same rounding as a sum of one PnL per sensitivity
+        PnL = np.zeros(len(index), dtype=dtype)
+        first_i, first_val = first_order
+        for i, val in zip(first_i, first_val.astype(dtype)):
+            PnL += returns[:, i] * val
+        if gamma.any():
+            PnL += (returns**2) @ (gamma / 2).astype(dtype)
+        cross_i, cross_j, cross_val = cross
+        if len(cross_val) > 0:
+            PnL += (returns[:, cross_i] * returns[:, cross_j]) @ cross_val.astype(dtype)
+
+        # Data quality: each sensitivity counts once on each of its risk factors
+        if list_rf[0].quality_mask is not None:
+            rf_counts = {rf.bit: int(count) for rf, count in zip(list_rf, counts)}
+            self._add_quality(list_rf[0].quality_mask, rf_counts)
+            return pd.DataFrame({"PnL": PnL}, index=index)
+        quality = (
+            np.stack(
+                [rf.get_data()["quality"].reindex(index).values for rf in list_rf],
+                axis=1,
+            )
+            @ counts
+        )
+        return pd.DataFrame(
+            {"PnL": PnL, "quality": quality, "qt": int(counts.sum())}, index=index
+        )
+
+    def compute_PnL(
+        self,
+        re_compute: bool = False,
+        on_consumed: Callable[["Node"], None] = None,
+    ) -> pd.DataFrame:
+        """
+        Compute (lazily) the PnL of the node
+
+        Contributions are summed one at a time, so that only one partial
+        PnL per level of the tree is alive. 'on_consumed' is called on each
+        child once its PnL has been added to the one of this node.
+        """
+        if self.has_PnL() and not re_compute:
             return self.PnL
         else:
 
             # Take into account its owns sensitivities
             # + the one of its children
-            list_PnL = []
+            df_PnL = None
+            max_len = 0
+            self.quality_mask = None
+            self.rf_counts = {}
             # Own sensitivity part
             if self.sensitivities:
-                for sensitivity in self.sensitivities.sensitivities:
-                    rf_data = sensitivity[0].get_data()
-                    val = sensitivity[2]
-                    PnL_data = rf_data
-                    PnL_data["PnL"] = PnL_data["returns"] * val
-                    PnL_data["qt"] = 1
-                    PnL_data = PnL_data.drop(["returns"], axis=1)
-                    list_PnL.append(PnL_data)
+                PnL_data = self.compute_sensitivity_PnL()
+                max_len = max(max_len, PnL_data.shape[0])
+                df_PnL = self._aggregate_PnL(df_PnL, PnL_data)
 
             # Children part
             for child in self.children:
-                list_PnL.append(child.compute_PnL())
-
-            max_len = max([el.shape[0] for el in list_PnL])
-            df_PnL_quality = pd.concat(
-                [el[["quality"]] for el in list_PnL], axis=1
-            ).sum(axis=1)
-            df_PnL_value = (
-                pd.concat([el[["PnL"]] for el in list_PnL], axis=1)
-                .dropna(how='any')
-                .sum(axis=1)
-            )
-            df_PnL_qt = pd.concat([el[["qt"]] for el in list_PnL], axis=1).sum(axis=1)
+                child_PnL = child.compute_PnL(on_consumed=on_consumed)
+                max_len = max(max_len, child_PnL.shape[0])
+                df_PnL = self._aggregate_PnL(df_PnL, child_PnL)
+                del child_PnL
+                if child.quality_mask is not None:
+                    self._add_quality(child.quality_mask, child.rf_counts)
+                if on_consumed:
+                    on_consumed(child)
 
-            df_PnL = pd.concat(
-                [df_PnL_value, df_PnL_quality, df_PnL_qt], axis=1
-            ).dropna(how='any')
-
-            df_PnL.columns = ["PnL", "quality", "qt"]
+            df_PnL = df_PnL.drop(columns="compensation", errors="ignore").sort_index()
 
             loss_rate = (1 - (df_PnL.shape[0] / max_len)) * 100
             print("\tNode ", self.name, " loss rate : ", loss_rate)
@@ -151,8 +458,16 @@ class Graph:
         # Root node
         self.root: Node = _root
 
+        # Tree index (Euler tour + parents) and cache of subgraphs. A
+        # subgraph keeps its owner: edits are made on the owner's tree
+        self._build_index()
+        self._subgraphs: Dict[str, Graph] = {}
+        self._owner: Graph = None
+
         # Set default parameters
         self.set_parameters(None, None)
+        self.set_scenario_weights(None)
+        self.set_retention(PNL_RETENTION)
 
     def set_parameters(self, percentile: float, window: int):
         if percentile:
@@ -173,6 +488,80 @@ class Graph:
         else:
             self.window = WINDOW
 
+    def set_scenario_weights(self, decay: float):
+        """
+        Time-weighted scenarios (BRW): weight of a scenario of age k in the
+        window proportional to decay^k. None for equally weighted scenarios.
+        """
+        if decay:
+            msg_alert = "Decay must be a float between 0 and 1"
+            assert isinstance(decay, float), msg_alert
+            assert 0 < decay <= 1, msg_alert
+        self.brw_decay: float = decay
+
+    def set_retention(
+        self,
+        retention: Literal["all", "requested", "spill"],
+        requested_nodes: List[str] = None,
+        spill_dir: Union[str, Path] = None,
+    ):
+        """
+        Define what is kept of the intermediate PnL vectors
+
+        - all: every node keeps its PnL
+        - requested: only the root and 'requested_nodes' keep their PnL
+        - spill: other nodes are written to memory-mapped files in 'spill_dir'
+          (temporary directory by default) and read back when needed
+        """
+        assert retention in (
+            "all",
+            "requested",
+            "spill",
+        ), "Retention must be one of 'all', 'requested', 'spill'"
+        requested_nodes = requested_nodes or []
+        for name in requested_nodes:
+            assert name in self.nodes.keys(), f"{name} not in list of nodes"
+        self.retention: str = retention
+        self.requested_nodes: set = set(requested_nodes)
+        self.requested_nodes.add(self.root.name)
+
+        # The temporary spill directory belongs to the graph: it is removed
+        # with the graph or when the retention is changed
+        previous = getattr(self, "_spill_cleanup", None)
+        if previous is not None and previous.alive:
+            for node in self.nodes.values():
+                if node._spilled_PnL is not None:
+                    node.release_PnL()  # Recomputed when needed
+            previous()
+        self._spill_cleanup = None
+        if retention == "spill" and spill_dir is None:
+            spill_dir = tempfile.mkdtemp(prefix="var_engine_")
+            self._spill_cleanup = weakref.finalize(
+                self, shutil.rmtree, spill_dir, ignore_errors=True
+            )
+        self.spill_dir: Path = Path(spill_dir) if spill_dir else None
+        if self.spill_dir:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+
+    def _on_PnL_consumed(self, node: Node):
+        if self.retention == "all" or node.name in self.requested_nodes:
+            return
+        if self.retention == "requested":
+            node.release_PnL()
+        else:
+            node.spill_PnL(self.spill_dir)
+
+    def compute_PnL(
+        self, re_compute: bool = False, node: Union[Type[Node], str] = None
+    ) -> pd.DataFrame:
+        # Lauch PnL computation on root (or a given node),
+        # applying the retention policy
+        if node is None:
+            node = self.root
+        elif isinstance(node, str):
+            node = self.get_node(node)
+        return node.compute_PnL(re_compute, on_consumed=self._on_PnL_consumed)
+
     # Getters
     def get_node(self, name: str) -> Node:
         assert name in self.nodes.keys(), f"{name} not in list of nodes"
@@ -181,34 +570,145 @@ class Graph:
     def get_root(self):
         return self.root
 
+    def _as_node(self, node: Union[Type[Node], str]) -> Node:
+        if isinstance(node, str):
+            return self.get_node(node)
+        return node
+
+    # Tree index
+    def _build_index(self):
+        """
+        Euler tour of the tree
+
+        Nodes are stored in pre-order, so that the subtree of a node is the
+        slice [enter, exit] of this order. The parent of each node is kept
+        for ancestor lookups. Built once, rebuilt after a change of the tree.
+        """
+        order: List[Node] = []
+        parents: Dict[str, str] = {}
+        stack = [(self.root, None)]
+        while stack:
+            node, parent_name = stack.pop()
+            assert node.name not in parents, "Graph Fatal error (for dev)"
+            parents[node.name] = parent_name
+            order.append(node)
+            for child in reversed(node.get_children()):
+                stack.append((child, node.name))
+
+        enter = {node.name: position for position, node in enumerate(order)}
+        size = {}
+        for node in reversed(order):  # Children before their parent
+            size[node.name] = 1 + sum(size[child.name] for child in node.children)
+
+        self._order: List[Node] = order
+        self._enter: Dict[str, int] = enter
+        self._exit: Dict[str, int] = {
+            name: position + size[name] - 1 for name, position in enter.items()
+        }
+        self._parents: Dict[str, str] = parents
+
+    def invalidate_index(self):
+        # To be called when the tree is modified: cached subgraphs are
+        # refreshed, or dropped if their root left the tree
+        self._build_index()
+        for name, subgraph in list(self._subgraphs.items()):
+            if name not in self.nodes.keys():
+                del self._subgraphs[name]
+                continue
+            subgraph.nodes.clear()
+            subgraph.nodes.update(
+                {node.name: node for node in self.get_descendants(name)}
+            )
+            subgraph.requested_nodes &= set(subgraph.nodes.keys())
+            subgraph.requested_nodes.add(name)
+            subgraph._build_index()
+
+    def _release_path(self, node: Node):
+        # PnL of a node and its ancestors is outdated after a change below it
+        for outdated in [node] + self.get_ancestors(node):
+            outdated.release_PnL()
+
+    def add_node(self, node: Node, parent: Union[Type[Node], str]):
+        """
+        Attach a node (and its children) under 'parent'
+        """
+        parent = self._as_node(parent)
+        if self._owner is not None:
+            return self._owner.add_node(node, parent)
+        assert node.name not in self.nodes.keys(), f"{node.name} already in graph"
+        self._release_path(parent)
+        parent.children.append(node)
+        stack = [node]
+        while stack:
+            new_node = stack.pop()
+            self.nodes[new_node.name] = new_node
+            stack += new_node.get_children()
+        self.invalidate_index()
+
+    def remove_node(self, node: Union[Type[Node], str]):
+        """
+        Detach a node (and its children) from the tree
+        """
+        node = self._as_node(node)
+        assert node is not self.root, "Cannot remove the root node"
+        if self._owner is not None:
+            return self._owner.remove_node(node)
+        parent = self.get_parent(node)
+        self._release_path(parent)
+        for sub_node in self._order[self._enter[node.name] : self._exit[node.name] + 1]:
+            del self.nodes[sub_node.name]
+        parent.children.remove(node)
+        self.invalidate_index()
+
+    def is_descendant(
+        self, node: Union[Type[Node], str], ancestor: Union[Type[Node], str]
+    ) -> bool:
+        # True if 'node' is in the subtree of 'ancestor' (itself included)
+        node, ancestor = self._as_node(node), self._as_node(ancestor)
+        position = self._enter[node.name]
+        return self._enter[ancestor.name] <= position <= self._exit[ancestor.name]
+
+    def get_parent(self, node: Union[Type[Node], str]) -> Node:
+        parent_name = self._parents[self._as_node(node).name]
+        return self.nodes[parent_name] if parent_name is not None else None
+
+    def get_ancestors(self, node: Union[Type[Node], str]) -> List[Node]:
+        # Path from the parent of 'node' up to the root
+        ancestors = []
+        parent = self.get_parent(node)
+        while parent is not None:
+            ancestors.append(parent)
+            parent = self.get_parent(parent)
+        return ancestors
+
+    def get_descendants(self, node: Union[Type[Node], str]) -> List[Node]:
+        # All nodes of the subtree of 'node' (itself included), in pre-order
+        name = self._as_node(node).name
+        return self._order[self._enter[name] : self._exit[name] + 1]
+
     # Access Subgraph to compute Var on a smaller level of aggregation
     def get_subgraph_from(self, node: Union[Type[Node], str]):
         # Important if we want to compute the VaR at smaller aggregation levels
-        if isinstance(node, str):
-            root = self.get_node(node)
-        else:
-            root = node
-
-        # Build sub-node dict
-        list_children = root.get_children().copy()
-        memory_temp_1 = list_children
-        memory_temp_2 = []
-        is_stationnary = False
-        iter = 0  # Protection against an infinite loop
-        while not is_stationnary and iter <= 1000:
-            memory_temp_2 = []
-            for child in memory_temp_1:
-                memory_temp_2 += child.get_children()
-            memory_temp_1 = memory_temp_2
-            list_children += memory_temp_2
-            if len(memory_temp_1) == 0:
-                is_stationnary = True
-            iter += 1
-        assert iter != 1000, "Graph Fatal error (for dev)"
-        dict_nodes = {node.name: node for node in list_children}
-        dict_nodes[root.name] = root
-        new_name = f"Graph of '{root.name}' from '{self.name}'"
-        return Graph(new_name, root, dict_nodes)
+        root = self._as_node(node)
+        if self._owner is not None:
+            return self._owner.get_subgraph_from(root)
+        if root.name not in self._subgraphs.keys():
+            dict_nodes = {node.name: node for node in self.get_descendants(root)}
+            new_name = f"Graph of '{root.name}' from '{self.name}'"
+            subgraph = Graph(new_name, root, dict_nodes)
+            subgraph.set_retention(
+                self.retention,
+                [name for name in self.requested_nodes if name in dict_nodes.keys()],
+                self.spill_dir,
+            )
+            subgraph._owner = self
+            self._subgraphs[root.name] = subgraph
+        subgraph = self._subgraphs[root.name]
+
+        # PnL released by the retention policy is computed again
+        if self.root.has_PnL() and not root.has_PnL():
+            subgraph.compute_PnL()
+        return subgraph
 
     def show_graph(self, save: bool = False):
         mermaid_graph = "graph LR\n"
@@ -240,65 +740,171 @@ class Graph:
         return save_mmd(mermaid_graph, path)
 
     # VaR computation
-    def compute_VaR_on_date(self, date: str):
-        # Compute PnL
-        assert self.root.PnL is not None, "Compute PnL on root node before !!!!"
-
+    @staticmethod
+    def _on_grid(nb_scenarios: int, percentile: float) -> bool:
+        # True if percentile * 100 is a point of the grid of step 100 / (n - 1)
+        positions = np.arange(nb_scenarios) * (100 / (nb_scenarios - 1))
+        return bool((positions == percentile * 100).any())
+
+    @staticmethod
+    def sorted_VaR(values: np.ndarray, percentile: float) -> np.ndarray:
+        """
+        VaR of equally weighted PnL scenarios, one set of scenarios per row
+
+        Scenarios sorted by decreasing PnL are placed on a grid of step
+        100 / (n - 1) and the PnL is linearly interpolated at
+        percentile * 100 (same arithmetic as np.interp). As with the pandas
+        interpolation of the README, a scenario lying exactly on the
+        percentile is replaced by the interpolation of its neighbours.
+        """
+        values = -np.sort(-values, axis=1)
+        nb_scenarios = values.shape[1]
+        positions = np.arange(nb_scenarios) * (100 / (nb_scenarios - 1))
+        target = percentile * 100
+        kept = positions != target
+        positions, values = positions[kept], values[:, kept]
+
+        upper = np.searchsorted(positions, target, side="right")
+        x0, x1 = positions[upper - 1], positions[upper]
+        y0, y1 = values[:, upper - 1], values[:, upper]
+        slope = (y1 - y0) / (x1 - x0)
+        return np.maximum(-(slope * (target - x0) + y0), 0)
+
+    def get_scenario_weights(self, nb_scenarios: int) -> np.ndarray:
+        # BRW weights of the scenarios of a window (sorted by date)
+        ages = np.arange(nb_scenarios)[::-1]  # 0 for the most recent date
+        return self.brw_decay**ages
+
+    @staticmethod
+    def weighted_VaR(
+        values: np.ndarray, weights: np.ndarray, percentile: float
+    ) -> np.ndarray:
+        """
+        VaR of weighted PnL scenarios, one set of scenarios per row
+
+        Each sorted scenario sits at the middle of its cumulated weight, so a
+        heavy scenario in the tail keeps its weight. Positions are shifted by
+        half the smallest weight and rescaled: with equal weights this is the
+        same grid as the unweighted VaR (step of 100 / (n - 1)). Beyond the
+        first and last positions the VaR is the extreme scenario.
+        """
+        order = np.argsort(-values, axis=1, kind="stable")
+        values = np.take_along_axis(values, order, axis=1)
+        weights = np.take_along_axis(weights, order, axis=1)
+        weights = weights / weights.sum(axis=1, keepdims=True)
+        shift = weights.min(axis=1, keepdims=True) / 2
+        positions = (np.cumsum(weights, axis=1) - weights / 2 - shift) / (1 - 2 * shift)
+
+        # Linear interpolation on each row (as np.interp)
+        target = percentile * 100
+        upper = (positions * 100 <= target).sum(axis=1, keepdims=True)
+        upper = np.clip(upper, 1, values.shape[1] - 1)
+        x0 = np.take_along_axis(positions, upper - 1, axis=1) * 100
+        x1 = np.take_along_axis(positions, upper, axis=1) * 100
+        y0 = np.take_along_axis(values, upper - 1, axis=1)
+        y1 = np.take_along_axis(values, upper, axis=1)
+        VaR = y0 + (y1 - y0) * np.clip((target - x0) / (x1 - x0), 0, 1)
+        return np.maximum(-VaR[:, 0], 0)
+
+    def get_window_bounds(
+        self, dates: list, node: Union[Type[Node], str] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Windows ending on dates, as positions [start, end) in the PnL of node
+        (root node by default)
+
+        The window of a date keeps the PnL dates in
+        ]date + 1 day - window, date + 1 day] (calendar days).
+        """
+        node = self.root if node is None else self._as_node(node)
+        return self._window_bounds(node.get_PnL_axis()[0], dates)
+
+    def _window_bounds(
+        self, axis_dates: np.ndarray, dates: list
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        dates = pd.DatetimeIndex(dates) + pd.Timedelta(days=1)
+        ends = axis_dates.searchsorted(dates.values, side="right")
+        starts = axis_dates.searchsorted((dates - self.window).values, side="right")
+        return starts, ends
+
+    def get_PnL_window(
+        self, date: str, node: Union[Type[Node], str] = None
+    ) -> pd.DataFrame:
+        # PnL of the historical window ending on date (root node by default)
+        node = self.root if node is None else self._as_node(node)
         if isinstance(date, str):
             date = parse(date, dayfirst=True)
+        PnL = node.PnL  # Read once (spilled PnL)
+        assert PnL is not None, f"Compute PnL on {node.name} node before !!!!"
+        starts, ends = self._window_bounds(PnL.index.values, [date])
+        return PnL.iloc[starts[0] : ends[0]]
+
+    def get_dates_between(self, start_date: str, end_date: str) -> pd.DatetimeIndex:
+        from_date = parse(start_date, dayfirst=True)
+        to_date = parse(end_date)
+        assert from_date < to_date, "start date > end date !!!"
+        return pd.date_range(from_date, to_date, freq="D", name="date")
 
-        # Filter PnL Series on date (with intrapolation)
-        # + get previous values according to window
-        date += timedelta(days=1)
-        PnL_filter = self.root.PnL[
-            (self.root.PnL.index <= date) & (self.root.PnL.index > date - self.window)
-        ]
+    def compute_VaR_from_PnL(self, PnL: np.ndarray) -> float:
+        # VaR of the PnL scenarios of a window (sorted by date)
+        values = np.asarray(PnL, dtype=np.float64)
+        if len(values) > 1:
+            if self.brw_decay:
+                weights = self.get_scenario_weights(len(values))
+                return float(
+                    self.weighted_VaR(values[None], weights[None], self.percentile)[0]
+                )
+            return float(self.sorted_VaR(values[None], self.percentile)[0])
 
-        PnL_filter_serie = PnL_filter["PnL"].sort_values(ascending=False)
+        elif len(values) > 0:
+            return max(-float(values[0]), 0)
 
-        if len(PnL_filter_serie) > 1:
-            # VaR
-            step = 100 / (len(PnL_filter_serie) - 1)
-            PnL_filter_serie.index = PnL_filter_serie.reset_index().index * step
-            PnL_filter_serie[self.percentile * 100] = None
-            PnL_filter_serie = PnL_filter_serie.interpolate(method="index")
-            VaR = max(-float(PnL_filter_serie[self.percentile * 100]), 0)
+        return 0
 
-            # Confidence
-            confidence_data = float(
-                PnL_filter["quality"].sum() / PnL_filter["qt"].sum()
-            )
-            confidence_size = min(len(PnL_filter_serie), 100) / 100
-            confidence = (confidence_data + confidence_size) / 2
+    def _compute_VaR_on_window(self, axis: tuple, start: int, end: int):
+        _, values, cum_quality, cum_qt = axis
 
-        elif len(PnL_filter_serie) > 0:
-            VaR = max(-float(PnL_filter_serie.iloc[0]), 0)
-            confidence = 0
+        # VaR
+        VaR = self.compute_VaR_from_PnL(values[start:end])
 
+        if end - start > 1:
+            # Confidence
+            quality = cum_quality[end] - cum_quality[start]
+            qt = cum_qt[end] - cum_qt[start]
+            confidence_data = float(quality / qt)
+            # The interpolated percentile counts as a scenario unless it
+            # replaced one lying on the grid
+            nb_rows = end - start + (not self._on_grid(end - start, self.percentile))
+            confidence_size = min(nb_rows, 100) / 100
+            confidence = (confidence_data + confidence_size) / 2
         else:
-            VaR = 0
             confidence = 0
 
         return VaR, confidence
 
-    def compute_VaR_between(self, start_date: str, end_date: str) -> pd.DataFrame:
+    def compute_VaR_on_date(self, date: str):
         # Compute PnL
-        assert self.root.PnL is not None, "Compute PnL on root node before !!!!"
+        assert self.root.has_PnL(), "Compute PnL on root node before !!!!"
 
-        from_date = parse(start_date, dayfirst=True)
-        to_date = parse(end_date)
-        assert from_date < to_date, "start date > end date !!!"
+        if isinstance(date, str):
+            date = parse(date, dayfirst=True)
+
+        axis = self.root.get_PnL_axis()
+        starts, ends = self._window_bounds(axis[0], [date])
+        return self._compute_VaR_on_window(axis, starts[0], ends[0])
+
+    def compute_VaR_between(self, start_date: str, end_date: str) -> pd.DataFrame:
+        # Compute PnL
+        assert self.root.has_PnL(), "Compute PnL on root node before !!!!"
 
-        list_of_dates: list = []
-        date = from_date
-        while date <= to_date:
-            list_of_dates.append(date)
-            date += timedelta(days=1)
+        # Dates converted once to windows of the PnL axis
+        list_of_dates = self.get_dates_between(start_date, end_date)
+        axis = self.root.get_PnL_axis()
+        starts, ends = self._window_bounds(axis[0], list_of_dates)
 
-        # Compute VaR using the previous function
         VaR_list = []
-        for date in list_of_dates:
-            VaR_list.append(self.compute_VaR_on_date(date))
+        for start, end in zip(starts, ends):
+            VaR_list.append(self._compute_VaR_on_window(axis, start, end))
 
         # Create the serie to return
         VaR_df = pd.DataFrame(VaR_list)
@@ -72,13 +72,17 @@ def read_input_file(filepath: Union[str, Path]):
     assert "Type" in sensitivities_df.columns, "'Type' column is missing in 'Risk' tab"
     assert "Val" in sensitivities_df.columns, "'Val' column is missing in 'Risk' tab"
     sensitivities_df["Val"] = sensitivities_df["Val"].astype(float)
-    for col in ('NodeName', 'RF', 'Type'):
+    if "RF2" not in sensitivities_df.columns:  # Optional, for cross gammas
+        sensitivities_df["RF2"] = ""
+    for col in ('NodeName', 'RF', 'Type', 'RF2'):
         sensitivities_df[col] = sensitivities_df[col].fillna("").astype(str)
     expected_nodename = set(sensitivities_df.NodeName.unique())
     assert (
         len(expected_nodename - read_nodename) == 0
     ), f"Missing Node: {','.join(list(expected_nodename - read_nodename))} in PF tab"
-    expected_md = set(sensitivities_df.RF.unique())
+    expected_md = set(sensitivities_df.RF.unique()) | (
+        set(sensitivities_df.RF2.unique()) - {""}
+    )
     assert (
         len(expected_md - read_MD) == 0
     ), f"Missing Node: {','.join(list(expected_md - read_MD))} in  tab MD"
@@ -0,0 +1,158 @@
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+from var_engine.aggregation import create_sensitivity
+from var_engine.default_config import (
+    SERVICE_CACHE_SIZE,
+    SERVICE_HOST,
+    SERVICE_PORT,
+)
+from var_engine.model import Graph, Node, RiskFactor
+
+
+class WhatIfService:
+    """
+    Pre and post-trade VaR of hypothetical sensitivities
+
+    Market data, node PnL vectors and the PnL windows (with their VaR) are
+    kept in memory. A request only computes the PnL of the new
+    sensitivities and adds it to the cached windows of the node and of the
+    root. Cached data is never modified, so requests can run concurrently.
+    The 'cache_size' most recently used windows are kept.
+    """
+
+    def __init__(
+        self,
+        _graph: Graph,
+        _market_data: Dict[str, RiskFactor],
+        _date: str = None,
+        cache_size: int = SERVICE_CACHE_SIZE,
+    ):
+        self.graph: Graph = _graph
+        self.market_data: Dict[str, RiskFactor] = _market_data
+        self.date: pd.Timestamp = self.__parse(
+            _date or datetime.now().strftime("%Y-%m-%d")
+        )
+
+        # LRU cache: (node name, date) -> (PnL window, VaR)
+        self.windows: Dict[Tuple[str, pd.Timestamp], Tuple[pd.Series, float]] = (
+            OrderedDict()
+        )
+        self.cache_size: int = cache_size
+        self._lock = threading.Lock()
+
+        # Warm up
+        self.get_window(self.graph.get_root().name, self.date)
+
+    @staticmethod
+    def __parse(date: str) -> pd.Timestamp:
+        # ISO format (YYYY-MM-DD) for the requests
+        return pd.Timestamp(date).normalize()
+
+    def get_window(self, node_name: str, date: pd.Timestamp) -> Tuple[pd.Series, float]:
+        key = (node_name, date)
+        with self._lock:
+            if key in self.windows.keys():
+                self.windows.move_to_end(key)
+                return self.windows[key]
+
+            node = self.graph.get_node(node_name)
+            if not node.has_PnL():  # Released by the retention policy
+                self.graph.compute_PnL(node=node)
+            PnL = self.graph.get_PnL_window(date.to_pydatetime(), node)["PnL"]
+            self.windows[key] = (PnL, self.graph.compute_VaR_from_PnL(PnL))
+            if len(self.windows) > self.cache_size:
+                self.windows.popitem(last=False)  # Least recently used
+            return self.windows[key]
+
+    def what_if(self, node_name: str, list_sensi: List[dict], date: str = None) -> dict:
+        """
+        VaR of a node and of the root, before and after adding sensitivities
+
+        'list_sensi' are rows of the Risk tab (RF, Type, Val and RF2 keys)
+        """
+        date = self.__parse(date) if date else self.date
+        root_name = self.graph.get_root().name
+        self.graph.get_node(node_name)  # Check the node exists
+        assert (
+            isinstance(list_sensi, list) and len(list_sensi) > 0
+        ), "'sensitivities' must be a non empty list"
+
+        # PnL of the hypothetical trade only
+        new_node = Node(
+            f"{node_name}_what_if",
+            [],
+            create_sensitivity(f"{node_name}_what_if", list_sensi, self.market_data),
+        )
+        incremental = new_node.compute_sensitivity_PnL()["PnL"]
+
+        result = {"node": node_name, "date": date.strftime("%Y-%m-%d")}
+        for prefix, name in (("node", node_name), ("root", root_name)):
+            PnL, VaR = self.get_window(name, date)
+            post_PnL = (PnL + incremental.reindex(PnL.index)).dropna()
+            result[f"{prefix}_VaR_pre"] = VaR
+            result[f"{prefix}_VaR_post"] = self.graph.compute_VaR_from_PnL(post_PnL)
+        return result
+
+
+class WhatIfHandler(BaseHTTPRequestHandler):
+    """
+    GET /health
+    POST /whatif {"node": "N5", "date": "2025-01-14",
+                  "sensitivities": [{"RF": "Hermes", "Type": "Delta", "Val": 100}]}
+    """
+
+    service: WhatIfService = None
+
+    def _send(self, code: int, content: dict):
+        body = json.dumps(content).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._send(404, {"error": f"Unknown path {self.path}"})
+        self._send(
+            200, {"status": "ok", "date": self.service.date.strftime("%Y-%m-%d")}
+        )
+
+    def do_POST(self):
+        if self.path != "/whatif":
+            return self._send(404, {"error": f"Unknown path {self.path}"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length))
+            result = self.service.what_if(
+                request["node"], request["sensitivities"], request.get("date")
+            )
+        except (AssertionError, KeyError, TypeError, ValueError) as error:
+            return self._send(400, {"error": str(error)})
+        self._send(200, result)
+
+
+def create_server(
+    service: WhatIfService, host: str = SERVICE_HOST, port: int = SERVICE_PORT
+) -> ThreadingHTTPServer:
+    # One thread per request, all sharing the same service
+    handler = type("Handler", (WhatIfHandler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(service: WhatIfService, host: str = SERVICE_HOST, port: int = SERVICE_PORT):
+    server = create_server(service, host, port)
+    print(f"\nWhat-if VaR service listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -1,10 +1,21 @@
+import asyncio
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Union
 
 import pandas as pd
+from dateutil.parser import parse
 
 from var_engine.aggregation import build_aggregation_tree
-from var_engine.market_data import prepare_market_data
+from var_engine.bootstrap import bootstrap_VaR_between
+from var_engine.default_config import MAX_CONCURRENCY, PRECISION
+from var_engine.ingestion import find_feeds, run_ingestion
+from var_engine.market_data import (
+    attach_quality_mask,
+    build_calendar,
+    create_risk_factor,
+    prepare_market_data,
+)
 from var_engine.model import Graph
 from var_engine.read import read_input_file
 
@@ -13,9 +24,31 @@ class VaRStudy:
     def __init__(self, filepath: Union[str, Path]):
         self.filepath = filepath
 
-    def compute(self, start_date: str, end_date: str, window=None, percentile=None):
+    def compute(
+        self,
+        start_date: str,
+        end_date: str,
+        window=None,
+        percentile=None,
+        retention=None,
+        requested_nodes=None,
+        precision=None,
+        filtering=None,
+        brw_decay=None,
+        bootstrap=False,
+        nb_workers=None,
+    ):
         """
         Run the VaR model process
+
+        'retention' and 'requested_nodes' control which intermediate PnL
+        vectors are kept after aggregation (see Graph.set_retention)
+        'precision' selects the float64 (default) or compact float32 mode
+        'filtering' ("EWMA" or "GARCH") rescales returns to the volatility of
+        the VaR date: start and end dates must be the same
+        'brw_decay' weights the scenarios by their age
+        'bootstrap' adds VaR confidence intervals (VaR_lower, VaR_upper),
+        computed on 'nb_workers' processes
         """
 
         # 1. Data Processing
@@ -26,19 +59,113 @@ class VaRStudy:
             sensitivities_df,
         ) = read_input_file(self.filepath)
 
+        # Filtered returns are only valid for the VaR of one date (no
+        # look-ahead on the previous dates)
+        if filtering:
+            assert start_date == end_date or parse(start_date, dayfirst=True) == parse(
+                end_date
+            ), "Filtered VaR is computed on one date: use the same start and end date"
+            start_date = (parse(end_date) - timedelta(days=1)).strftime("%d/%m/%Y")
+
         # 2. Sensitivity Feeds and Mapping
-        market_data_dict = prepare_market_data(market_data_df, mapping_market_data_df)
+        market_data_dict = prepare_market_data(
+            market_data_df,
+            mapping_market_data_df,
+            precision=precision or PRECISION,
+            filtering=filtering,
+            filtering_date=parse(end_date) if filtering else None,
+        )
 
         # 3. Scenario Generation
         var_tree: Graph = build_aggregation_tree(
             market_data_dict, graph_tree_df, sensitivities_df
         )
         var_tree.set_parameters(percentile, window)
+        var_tree.set_scenario_weights(brw_decay)
+        if retention:
+            var_tree.set_retention(retention, requested_nodes)
 
         # 4. PnL aggregation
         print("\nCompute PnL")
-        var_tree.root.compute_PnL()  # Lauch PnL computation (maybe time consuming)
+        var_tree.compute_PnL()  # Lauch PnL computation (maybe time consuming)
+        self.var_tree = var_tree  # Save result to the main class
+        self.market_data_dict = market_data_dict
+
+        # 5. VaR calculation
+        var: pd.Series = var_tree.compute_VaR_between(
+            start_date,
+            end_date,
+        )
+        if bootstrap:
+            var = var.join(
+                bootstrap_VaR_between(
+                    var_tree, start_date, end_date, nb_workers=nb_workers
+                )
+            )
+        if filtering:
+            var = var.iloc[[-1]]
+
+        return var
+
+    def compute_from_feeds(
+        self,
+        start_date: str,
+        end_date: str,
+        history_start: str,
+        landing_dir: Union[str, Path] = None,
+        db_path: Union[str, Path] = None,
+        max_concurrency: int = MAX_CONCURRENCY,
+        window=None,
+        percentile=None,
+        retention=None,
+        requested_nodes=None,
+        precision=None,
+    ):
+        """
+        Run the VaR model process with market data read from local feeds
+
+        The input file gives the mapping, the tree and the sensitivities
+        (only the columns of its 'MD' tab are used). Market data is read
+        concurrently from the landing directory and the price database, and
+        the PnL of each sub-tree is aggregated as soon as its risk factors
+        are loaded. 'history_start' is the oldest date of the calendar.
+        """
+
+        # 1. Data Processing
+        (
+            market_data_df,
+            mapping_market_data_df,
+            graph_tree_df,
+            sensitivities_df,
+        ) = read_input_file(self.filepath)
+
+        # 2. Risk factors (empty until their feed is read)
+        print("\nPrepare Market Data")
+        calendar = build_calendar(parse(history_start, dayfirst=True), datetime.now())
+        market_data_dict = {
+            rf_name: create_risk_factor(rf_name, mapping_market_data_df)
+            for rf_name in market_data_df.columns
+        }
+        if (precision or PRECISION) == "float32":
+            attach_quality_mask(market_data_dict, calendar)
+        feeds = find_feeds(list(market_data_dict.keys()), landing_dir, db_path)
+
+        # 3. Scenario Generation
+        var_tree: Graph = build_aggregation_tree(
+            market_data_dict, graph_tree_df, sensitivities_df
+        )
+        var_tree.set_parameters(percentile, window)
+        if retention:
+            var_tree.set_retention(retention, requested_nodes)
+
+        # 4. Ingestion and PnL aggregation
+        print("\nIngest Market Data and Compute PnL")
+        asyncio.run(
+            run_ingestion(var_tree, market_data_dict, calendar, feeds, max_concurrency)
+        )
+        var_tree.compute_PnL()  # Root is already computed once all feeds are read
         self.var_tree = var_tree  # Save result to the main class
+        self.market_data_dict = market_data_dict
 
         # 5. VaR calculation
         var: pd.Series = var_tree.compute_VaR_between(
@@ -48,5 +175,27 @@ class VaRStudy:
 
         return var
 
+    def validate_precision(
+        self,
+        start_date: str,
+        end_date: str,
+        window=None,
+        percentile=None,
+        precision="float32",
+    ) -> float:
+        """
+        Maximum VaR deviation of a precision mode from the float64 one
+        """
+        reference = self.compute(start_date, end_date, window, percentile)
+        var = self.compute(
+            start_date, end_date, window, percentile, precision=precision
+        )
+        deviation = float((var["VaR"] - reference["VaR"]).abs().max())
+        print(f"\nMaximum VaR deviation ({precision} vs float64): {deviation}")
+        return deviation
+
     def get_graph(self):
         return self.var_tree
+
+    def get_market_data(self):
+        return self.market_data_dict